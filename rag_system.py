@@ -6,52 +6,268 @@ Uses Ollama (Llama-3-8B-Instruct), LangChain, and FAISS for question answering
 
 import os
 import sys
+import hashlib
+import re
+from bisect import bisect_left, bisect_right
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import uuid
+import threading
+
+import faiss
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
 
 # LangChain imports
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.chains import ConversationalRetrievalChain
 from langchain.memory import ConversationBufferMemory
 from langchain_community.llms import Ollama
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Imported by the servers this module logs warnings only, keeping per-question
+# logging off the request path; `python rag_system.py` logs at INFO.
+# RAG_LOG_LEVEL overrides both
 logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("RAG_LOG_LEVEL", "WARNING").upper())
+
+# Ollama HTTP API; a shared session keeps the connection alive between calls
+OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_MODEL = "llama3"
+# Most tokens an answer may generate; longer answers are cut off. Override
+# with RAG_NUM_PREDICT (-1 removes the cap)
+OLLAMA_NUM_PREDICT = int(os.environ.get("RAG_NUM_PREDICT", "2048"))
+# Tag on the answering LLM, so streamed tokens from question condensing are skipped
+ANSWER_TAG = "rag_answer"
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0))
+
+# Neighbours per node in the HNSW graph; 32 keeps recall high for small KBs
+HNSW_NEIGHBORS = 32
+
+# int8-quantized ONNX export of MiniLM (see scripts/export_onnx_embeddings.py)
+ONNX_MODEL_DIR = Path("models/all-MiniLM-L6-v2-onnx")
+ONNX_MODEL_FILE = "model_int8.onnx"
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """MiniLM sentence embeddings served through onnxruntime"""
+    
+    def __init__(self, model_dir: Path = ONNX_MODEL_DIR, batch_size: int = 128, max_length: int = 256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(
+            str(Path(model_dir) / ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.batch_size = batch_size
+        self.max_length = max_length
+    
+    def tokenize(self, texts: List[str]) -> List[Tuple[List[int], Any]]:
+        """Tokenize texts into padded batches of similar length
+        
+        Returns (indices, batch) pairs so the token ids can be computed once
+        and fed to embed_tokenized later; sorting by length minimizes padding.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = []
+        for start in range(0, len(order), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch = self.tokenizer(
+                [texts[i] for i in indices],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            batches.append((indices, batch))
+        return batches
+    
+    def embed_tokenized(self, batches: List[Tuple[List[int], Any]], count: int) -> List[List[float]]:
+        """Mean-pool and L2-normalize token embeddings of pre-tokenized batches"""
+        vectors = [None] * count
+        for indices, batch in batches:
+            feeds = {k: v.astype(np.int64) for k, v in batch.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for i, vector in zip(indices, pooled.tolist()):
+                vectors[i] = vector
+        return vectors
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        return self.embed_tokenized(self.tokenize(texts), len(texts))
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def _walk_markdown(root):
+    """Yield DirEntry objects for every .md file under root, recursively"""
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_markdown(entry.path)
+            elif entry.name.endswith(".md"):
+                yield entry
+
+class FastTextSplitter:
+    """Greedy chunker that locates every separator in a single regex pass
+    
+    Break points are preferred in the same order as the recursive splitter
+    (paragraph, line, word), falling back to a hard cut when a window has none.
+    """
+    
+    _SEPARATOR_RE = re.compile(r"\n\n|\n| ")
+    _PRIORITY = {"\n\n": 0, "\n": 1, " ": 2}
+    
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+    
+    def split_text(self, text: str) -> List[str]:
+        by_priority = ([], [], [])
+        all_breaks = []
+        for match in self._SEPARATOR_RE.finditer(text):
+            by_priority[self._PRIORITY[match.group()]].append(match.end())
+            all_breaks.append(match.end())
+        
+        chunks = []
+        start, length = 0, len(text)
+        while start < length:
+            limit = start + self.chunk_size
+            if limit >= length:
+                cut = length
+            else:
+                cut = None
+                # Strongest separator that still fills at least half the chunk
+                for positions in by_priority:
+                    k = bisect_right(positions, limit) - 1
+                    if k >= 0 and positions[k] > start + self.chunk_size // 2:
+                        cut = positions[k]
+                        break
+                if cut is None:
+                    k = bisect_right(all_breaks, limit) - 1
+                    cut = all_breaks[k] if k >= 0 and all_breaks[k] > start else limit
+            
+            chunk = text[start:cut].strip()
+            if chunk:
+                chunks.append(chunk)
+            if cut >= length:
+                break
+            
+            # Start the next chunk on a separator inside the overlap window
+            k = bisect_left(all_breaks, cut - self.chunk_overlap)
+            next_start = all_breaks[k] if k < len(all_breaks) else cut
+            start = next_start if start < next_start < cut else cut
+        return chunks
+    
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        return [
+            Document(page_content=chunk, metadata=dict(doc.metadata))
+            for doc in documents
+            for chunk in self.split_text(doc.page_content)
+        ]
+
+class CachedRetriever(BaseRetriever):
+    """Retriever that memoizes results for repeated (normalized) questions"""
+    
+    base_retriever: BaseRetriever
+    cache_size: int = 256
+    cache: Dict[str, Any] = Field(default_factory=dict)
+    
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        key = " ".join(query.split()).lower()
+        docs = self.cache.pop(key, None)
+        if docs is None:
+            docs = self.base_retriever.invoke(query)
+            if len(self.cache) >= self.cache_size:
+                # Evict the least recently used entry
+                self.cache.pop(next(iter(self.cache)))
+        self.cache[key] = docs
+        return list(docs)
+
+class AnswerTokenHandler(BaseCallbackHandler):
+    """Callback that forwards tokens from the answering LLM call"""
+    
+    def __init__(self, on_token: Callable[[str], None]):
+        self.on_token = on_token
+    
+    def on_llm_new_token(self, token: str, *, tags: List[str] = None, **kwargs):
+        if tags and ANSWER_TAG in tags:
+            self.on_token(token)
 
 class NEARAGSystem:
-    def __init__(self, knowledge_base_path: str = "data/knowledge_base/snippets"):
+    def __init__(self, knowledge_base_path: str = "data/knowledge_base/snippets",
+                 vector_store_path: str = "data/vector_store"):
         self.knowledge_base_path = Path(knowledge_base_path)
+        self.vector_store_path = Path(vector_store_path)
         self.vector_store = None
         self.qa_chain = None
         self.embeddings = None
+        self.embedding_backend = None
+        self._signature = None
+        self._document_tokens = None
         
-        # Initialize components
-        self._setup_embeddings()
-        self._load_documents()
-        self._create_vector_store()
+        # Initialize components; when the saved vector store was built from
+        # other files, the knowledge base is read in the background while the
+        # embedding model loads. A warm start reads no snippet files at all
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            prefetch = None
+            if self.knowledge_base_path.exists() and not self._stored_matches_files():
+                prefetch = executor.submit(self._read_knowledge_base)
+            self._setup_embeddings()
+        
+        if not self._load_vector_store():
+            self._load_documents(prefetch)
+            self._create_vector_store()
         self._setup_qa_chain()
     
     def _setup_embeddings(self):
         """Setup HuggingFace embeddings"""
         logger.info("Setting up embeddings...")
+        
+        # Prefer the quantized ONNX export when it has been generated
+        if (ONNX_MODEL_DIR / ONNX_MODEL_FILE).exists():
+            try:
+                self.embeddings = OnnxMiniLMEmbeddings(ONNX_MODEL_DIR)
+                self.embedding_backend = "onnx-int8"
+                logger.info("✅ ONNX int8 embeddings loaded successfully")
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load ONNX embeddings, falling back to PyTorch: {e}")
+        
         try:
+            self.embedding_backend = "hf-torch"
             self.embeddings = HuggingFaceEmbeddings(
                 model_name="sentence-transformers/all-MiniLM-L6-v2",
                 model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
+                # Larger batches amortize tokenizer/dispatch overhead on CPU
+                encode_kwargs={'normalize_embeddings': True, 'batch_size': 128}
             )
             logger.info("✅ Embeddings loaded successfully")
         except Exception as e:
             logger.error(f"❌ Error loading embeddings: {e}")
             raise
     
-    def _load_documents(self):
-        """Load documents from knowledge base"""
+    def _load_documents(self, prefetch=None):
+        """Load documents from knowledge base, reusing prefetched file contents if given"""
         logger.info("Loading documents from knowledge base...")
         
         if not self.knowledge_base_path.exists():
@@ -59,48 +275,122 @@ class NEARAGSystem:
         
         try:
             # Load all markdown files
-            loader = DirectoryLoader(
-                str(self.knowledge_base_path),
-                glob="**/*.md",
-                loader_cls=TextLoader,
-                loader_kwargs={'encoding': 'utf-8'}
-            )
-            
-            documents = loader.load()
+            documents = [
+                Document(page_content=text, metadata={"source": source})
+                for source, text in (prefetch.result() if prefetch else self._read_knowledge_base())
+            ]
             logger.info(f"✅ Loaded {len(documents)} documents")
             
             # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-                separators=["\n\n", "\n", " ", ""]
-            )
+            text_splitter = FastTextSplitter(chunk_size=1000, chunk_overlap=200)
             
             self.documents = text_splitter.split_documents(documents)
             logger.info(f"✅ Split into {len(self.documents)} chunks")
             
+            # Tokenize chunks up front when the embedding backend supports it
+            if hasattr(self.embeddings, "tokenize"):
+                self._document_tokens = self.embeddings.tokenize(
+                    [doc.page_content for doc in self.documents]
+                )
+            
         except Exception as e:
             logger.error(f"❌ Error loading documents: {e}")
             raise
     
+    def _files_signature(self) -> str:
+        """Fingerprint the knowledge base files (path, mtime, size)
+        
+        Computed once per instance; the knowledge base is not modified while running.
+        """
+        if self._signature is None:
+            digest = hashlib.blake2b()
+            if self.knowledge_base_path.exists():
+                for entry in sorted(_walk_markdown(self.knowledge_base_path), key=lambda e: e.path):
+                    stat = entry.stat()
+                    digest.update(f"{entry.path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode("utf-8"))
+            self._signature = digest.hexdigest()
+        return self._signature
+    
+    def _source_signature(self) -> str:
+        """Fingerprint the embedding backend and knowledge base files"""
+        return f"{self.embedding_backend}:{self._files_signature()}"
+    
+    def _stored_matches_files(self) -> bool:
+        """True if the saved vector store was built from the current knowledge
+        base files; usable before the embedding backend is known"""
+        stored = self._stored_signature()
+        return stored is not None and stored.endswith(f":{self._files_signature()}")
+    
+    def _stored_signature(self):
+        """Signature of the sources the saved vector store was built from, if any"""
+        if not (self.vector_store_path / "index.faiss").exists():
+            return None
+        try:
+            return (self.vector_store_path / "source.sig").read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return None
+    
+    def _load_vector_store(self) -> bool:
+        """Load a saved FAISS vector store if the knowledge base is unchanged"""
+        stored = self._stored_signature()
+        if stored is None:
+            return False
+        
+        if stored != self._source_signature():
+            logger.info("Knowledge base changed since last build, rebuilding vector store...")
+            return False
+        
+        try:
+            # The docstore pickle is one this class wrote itself; the HNSW
+            # index is read fully into RAM (faiss only memory-maps IVF lists)
+            self.vector_store = FAISS.load_local(
+                str(self.vector_store_path),
+                self.embeddings,
+                allow_dangerous_deserialization=True
+            )
+            logger.info(f"✅ Vector store loaded from {self.vector_store_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load saved vector store, rebuilding: {e}")
+            return False
+    
+    def _read_knowledge_base(self) -> List[Tuple[str, str]]:
+        """Read every markdown file in the knowledge base concurrently"""
+        paths = sorted(entry.path for entry in _walk_markdown(self.knowledge_base_path))
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            texts = list(executor.map(lambda p: Path(p).read_bytes().decode("utf-8"), paths))
+        return list(zip(paths, texts))
+    
     def _create_vector_store(self):
         """Create FAISS vector store"""
         logger.info("Creating FAISS vector store...")
         
         try:
-            # Create vector store
-            self.vector_store = FAISS.from_documents(
-                self.documents,
-                self.embeddings
+            # Embed all chunks, then index them in an HNSW graph so queries
+            # take a few graph hops instead of a linear scan over every vector
+            if self._document_tokens is not None:
+                embedded = self.embeddings.embed_tokenized(self._document_tokens, len(self.documents))
+                self._document_tokens = None
+            else:
+                embedded = self.embeddings.embed_documents([doc.page_content for doc in self.documents])
+            vectors = np.asarray(embedded, dtype="float32")
+            index = faiss.IndexHNSWFlat(vectors.shape[1], HNSW_NEIGHBORS)
+            index.add(vectors)
+            
+            doc_ids = [str(uuid.uuid4()) for _ in self.documents]
+            self.vector_store = FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=InMemoryDocstore(dict(zip(doc_ids, self.documents))),
+                index_to_docstore_id=dict(enumerate(doc_ids))
             )
             
-            # Save vector store
-            vector_store_path = "data/vector_store"
-            os.makedirs(vector_store_path, exist_ok=True)
-            self.vector_store.save_local(vector_store_path)
+            # Save vector store along with the signature of its sources
+            os.makedirs(self.vector_store_path, exist_ok=True)
+            self.vector_store.save_local(str(self.vector_store_path))
+            (self.vector_store_path / "source.sig").write_text(self._source_signature(), encoding="utf-8")
             
-            logger.info(f"✅ Vector store created and saved to {vector_store_path}")
+            logger.info(f"✅ Vector store created and saved to {self.vector_store_path}")
             
         except Exception as e:
             logger.error(f"❌ Error creating vector store: {e}")
@@ -112,12 +402,18 @@ class NEARAGSystem:
         
         try:
             # Initialize Ollama LLM
-            llm = Ollama(
-                model="llama3",
+            # GPU offload is left to Ollama's automatic layer placement;
+            # num_thread covers the CPU fallback
+            llm_kwargs = dict(
+                model=OLLAMA_MODEL,
                 temperature=0.1,
                 top_p=0.9,
-                repeat_penalty=1.1
+                repeat_penalty=1.1,
+                num_ctx=4096,
+                num_predict=OLLAMA_NUM_PREDICT,
+                num_thread=os.cpu_count()
             )
+            llm = Ollama(tags=[ANSWER_TAG], **llm_kwargs)
             
             # Setup memory
             memory = ConversationBufferMemory(
@@ -129,9 +425,14 @@ class NEARAGSystem:
             # Create QA chain
             self.qa_chain = ConversationalRetrievalChain.from_llm(
                 llm=llm,
-                retriever=self.vector_store.as_retriever(
-                    search_type="similarity",
-                    search_kwargs={"k": 3}
+                condense_question_llm=Ollama(**llm_kwargs),
+                retriever=CachedRetriever(
+                    # Only pass on chunks that clear the relevance threshold,
+                    # so easy questions send less context to the LLM
+                    base_retriever=self.vector_store.as_retriever(
+                        search_type="similarity_score_threshold",
+                        search_kwargs={"score_threshold": 0.35, "k": 6}
+                    )
                 ),
                 memory=memory,
                 return_source_documents=True,
@@ -145,16 +446,23 @@ class NEARAGSystem:
             logger.error("Make sure Ollama is running and llama3 model is pulled")
             raise
     
-    def ask_question(self, question: str, chat_history: List = None) -> Dict[str, Any]:
-        """Ask a question and get an answer"""
+    def ask_question(self, question: str, chat_history: List = None,
+                     on_token: Callable[[str], None] = None) -> Dict[str, Any]:
+        """Ask a question and get an answer
+        
+        If on_token is given it is called with each answer token as Ollama
+        generates it; the full response is still returned at the end.
+        """
         if chat_history is None:
             chat_history = []
         
         try:
-            logger.info(f"Question: {question}")
+            logger.debug("Question: %s", question)
             
             # Get answer from QA chain
-            result = self.qa_chain({"question": question, "chat_history": chat_history})
+            callbacks = [AnswerTokenHandler(on_token)] if on_token else None
+            result = self.qa_chain({"question": question, "chat_history": chat_history},
+                                   callbacks=callbacks)
             
             answer = result.get("answer", "No answer generated")
             source_documents = result.get("source_documents", [])
@@ -167,7 +475,8 @@ class NEARAGSystem:
                 "chat_history": chat_history
             }
             
-            logger.info(f"Answer: {answer[:100]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Answer: %s...", answer[:100])
             return response
             
         except Exception as e:
@@ -179,6 +488,17 @@ class NEARAGSystem:
                 "chat_history": chat_history
             }
     
+    def keep_model_warm(self, keep_alive: str = "10m"):
+        """Ask Ollama to keep the model resident; an empty prompt only loads it"""
+        try:
+            SESSION.post(
+                f"{OLLAMA_BASE_URL}/api/generate",
+                json={"model": OLLAMA_MODEL, "prompt": "", "keep_alive": keep_alive},
+                timeout=60
+            )
+        except requests.RequestException as e:
+            logger.debug("Ollama keep-alive failed: %s", e)
+    
     def get_similar_documents(self, query: str, k: int = 3) -> List:
         """Get similar documents for a query"""
         try:
@@ -189,10 +509,10 @@ class NEARAGSystem:
             return []
     
     def list_available_documents(self) -> List[str]:
-        """List all available documents in the knowledge base"""
+        """List the source files indexed in the knowledge base"""
         try:
             docs = self.vector_store.docstore._dict
-            return list(docs.keys())
+            return sorted({doc.metadata.get("source", "Unknown") for doc in docs.values()})
         except Exception as e:
             logger.error(f"❌ Error listing documents: {e}")
             return []
@@ -200,8 +520,7 @@ class NEARAGSystem:
 def test_ollama_connection():
     """Test if Ollama is running and accessible"""
     try:
-        import requests
-        response = requests.get("http://localhost:11434/api/tags")
+        response = SESSION.get(f"{OLLAMA_BASE_URL}/api/tags")
         if response.status_code == 200:
             models = response.json().get("models", [])
             logger.info(f"✅ Ollama is running. Available models: {[m['name'] for m in models]}")
@@ -215,23 +534,30 @@ def test_ollama_connection():
 
 def main():
     """Main function for testing the RAG system"""
+    logging.basicConfig(level=logging.INFO)
+    if "RAG_LOG_LEVEL" not in os.environ:
+        logger.setLevel(logging.INFO)
     print("🚀 NEA Waste Management RAG System")
     print("=" * 50)
     
-    # Test Ollama connection
-    if not test_ollama_connection():
-        print("\n❌ Ollama is not running or accessible.")
-        print("Please ensure:")
-        print("1. Ollama is installed and running")
-        print("2. Llama-3 model is pulled: ollama pull llama3")
-        print("3. Ollama service is started")
-        return
+    # Test Ollama connection in the background while the RAG system initializes
+    executor = ThreadPoolExecutor(max_workers=1)
+    ollama_check = executor.submit(test_ollama_connection)
+    executor.shutdown(wait=False)
     
     try:
         # Initialize RAG system
         print("\n📚 Initializing RAG system...")
         rag_system = NEARAGSystem()
         
+        if not ollama_check.result():
+            print("\n❌ Ollama is not running or accessible.")
+            print("Please ensure:")
+            print("1. Ollama is installed and running")
+            print("2. Llama-3 model is pulled: ollama pull llama3")
+            print("3. Ollama service is started")
+            return
+        
         # Test questions
         test_questions = [
             "What is the current recycling rate in Singapore?",
@@ -269,6 +595,9 @@ def main():
                 
                 # Update chat history
                 chat_history.append((question, response['answer']))
+                
+                # Keep the model loaded while the user types the next question
+                threading.Thread(target=rag_system.keep_model_warm, daemon=True).start()
     
     except Exception as e:
         print(f"\n❌ Error: {e}")
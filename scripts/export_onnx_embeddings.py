@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Export MiniLM Embeddings to ONNX
+Exports the sentence-transformer used by the RAG system to ONNX and
+quantizes it to int8 for faster CPU inference through onnxruntime
+
+Needs optimum, which is not in requirements.txt: pip install "optimum[onnxruntime]"
+"""
+
+import sys
+from pathlib import Path
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+OUTPUT_DIR = Path("models/all-MiniLM-L6-v2-onnx")
+
+def export_model():
+    """Export the model and tokenizer to ONNX"""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+    
+    print(f"🔄 Exporting {MODEL_NAME} to ONNX...")
+    model = ORTModelForFeatureExtraction.from_pretrained(MODEL_NAME, export=True)
+    model.save_pretrained(OUTPUT_DIR)
+    AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(OUTPUT_DIR)
+    print(f"✅ ONNX model saved to {OUTPUT_DIR}")
+
+def quantize_model():
+    """Apply int8 dynamic quantization to the exported model"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    
+    print("🔄 Quantizing ONNX model to int8...")
+    quantize_dynamic(
+        str(OUTPUT_DIR / "model.onnx"),
+        str(OUTPUT_DIR / "model_int8.onnx"),
+        weight_type=QuantType.QInt8
+    )
+    print(f"✅ Quantized model saved to {OUTPUT_DIR / 'model_int8.onnx'}")
+
+def main():
+    """Main function"""
+    print("🚀 Exporting embeddings model for onnxruntime")
+    print("=" * 50)
+    
+    try:
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        export_model()
+        quantize_model()
+    except ImportError as e:
+        print(f"❌ Missing dependency: {e}")
+        print('   pip install "optimum[onnxruntime]>=1.16.0"')
+        return False
+    
+    print("\n🎉 Export complete! rag_system.py will now use the ONNX model")
+    print("   and rebuild the vector store on its next start.")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -3,12 +3,19 @@
 FastAPI RAG System with MLflow Tracking and CRM Integration
 """
 
-import json
+import orjson
 import time
 import uuid
 import sys
 import os
+import atexit
+import glob
+import gzip
+import zlib
+import asyncio
+import threading
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 import logging
 
@@ -17,9 +24,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import mlflow
 import mlflow.tracking
+import tiktoken
 
 # Import our RAG system
 from rag_system import NEARAGSystem
@@ -62,6 +71,23 @@ class ChatResponse(BaseModel):
     retrieval_score: Optional[float] = None
     timestamp: str
 
+@lru_cache(maxsize=1)
+def _token_encoder():
+    """cl100k_base encoder, loaded on first use; None if the BPE tables can't be
+    fetched (e.g. offline), in which case counts fall back to whitespace words"""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"⚠️ tiktoken encoder unavailable, counting words instead: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """Token count of text (encode_ordinary treats special-token text as plain text)"""
+    enc = _token_encoder()
+    if enc is None:
+        return len(text.split())
+    return len(enc.encode_ordinary(text))
+
 # Initialize MLflow
 mlflow.set_tracking_uri("sqlite:///mlflow.db")
 mlflow.set_experiment("nea_rag_system")
@@ -69,25 +95,209 @@ mlflow.set_experiment("nea_rag_system")
 # Initialize RAG system
 rag_system = None
 
+# The QA chain shares one conversation memory, so questions are answered one at
+# a time; they run in a worker thread so the event loop keeps serving requests
+RAG_CONCURRENCY = 1
+_rag_semaphore = asyncio.Semaphore(RAG_CONCURRENCY)
+
+# CRM log: one JSON line per chat, gzip-compressed and rotated daily, written
+# through a long-lived handle. Each process writes its own partition
+# (cases-YYYYMMDD-<start>-<pid>.jsonl.gz): a gzip member left open by a crash
+# is never appended to, and workers sharing the directory never interleave
+CRM_LOG_GLOB = "cases-*.jsonl.gz"
+CRM_PROCESS_TAG = f"{datetime.now():%H%M%S}-{os.getpid()}"
+CRM_LEGACY_LOG_PATH = "cases.json"
+CRM_COMPRESSLEVEL = 1
+CRM_FLUSH_EVERY = 32
+CRM_FLUSH_INTERVAL_S = 5.0
+
+_crm_lock = threading.Lock()
+_crm_fh = None
+_crm_path = None
+_crm_pending = 0
+_crm_last_flush = 0.0
+
+# CRM logging and MLflow tracking run off the request path on a bounded queue;
+# when it is full the oldest record is dropped and counted
+POST_CHAT_QUEUE_SIZE = 1000
+_post_chat_queue: Optional[asyncio.Queue] = None
+_post_chat_dropped = 0
+
+# Raw chat records are logged to MLflow as one artifact per batch
+ARTIFACT_BATCH_SIZE = 50
+_artifact_lock = threading.Lock()
+_artifact_buffer: List[Dict[str, Any]] = []
+
+# Running totals behind /metrics, rehydrated from the CRM log at startup
+_metrics_lock = threading.Lock()
+_metrics_state = {"n": 0, "sum_latency": 0.0, "sum_tokens": 0, "sum_retrieval": 0.0}
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize RAG system on startup"""
     global rag_system
+    # Close the CRM log at interpreter exit too, in case shutdown never runs
+    atexit.register(close_crm_log)
+    
     try:
         rag_system = NEARAGSystem()
         logger.info("✅ RAG system initialized successfully")
     except Exception as e:
         logger.error(f"❌ Failed to initialize RAG system: {e}")
         raise
+    
+    global _post_chat_queue
+    load_metrics_state()
+    # Load the token encoder now rather than on the first request
+    await run_in_threadpool(_token_encoder)
+    _post_chat_queue = asyncio.Queue(maxsize=POST_CHAT_QUEUE_SIZE)
+    asyncio.create_task(_post_chat_worker())
+    asyncio.create_task(_crm_flush_worker())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drain pending CRM/MLflow work, then flush and close the CRM log"""
+    if _post_chat_queue is not None:
+        try:
+            await asyncio.wait_for(_post_chat_queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Dropping {_post_chat_queue.qsize()} unrecorded chat interactions")
+    flush_chat_artifacts()
+    close_crm_log()
+
+def record_chat(chat_data: Dict[str, Any]):
+    """Log a chat interaction to the CRM and track it with MLflow"""
+    log_to_crm(chat_data)
+    track_metrics_with_mlflow(chat_data)
+
+async def _post_chat_worker():
+    """Record queued chat interactions in a worker thread"""
+    loop = asyncio.get_running_loop()
+    while True:
+        chat_data = await _post_chat_queue.get()
+        try:
+            await loop.run_in_executor(None, record_chat, chat_data)
+        except Exception as e:
+            logger.error(f"❌ Error recording chat interaction: {e}")
+        finally:
+            _post_chat_queue.task_done()
+
+def enqueue_chat_record(chat_data: Dict[str, Any]):
+    """Queue a chat interaction for recording, dropping the oldest one when full"""
+    global _post_chat_dropped
+    if _post_chat_queue is None:
+        record_chat(chat_data)
+        return
+    try:
+        _post_chat_queue.put_nowait(chat_data)
+    except asyncio.QueueFull:
+        dropped = _post_chat_queue.get_nowait()
+        _post_chat_queue.task_done()
+        _post_chat_dropped += 1
+        logger.warning(f"⚠️ Chat record queue full, dropped: {dropped['request_id']}")
+        _post_chat_queue.put_nowait(chat_data)
+
+async def _crm_flush_worker():
+    """Periodically flush buffered CRM lines so idle periods don't hold data back"""
+    while True:
+        await asyncio.sleep(CRM_FLUSH_INTERVAL_S)
+        flush_crm_log()
+
+def _flush_crm_locked():
+    global _crm_pending, _crm_last_flush
+    if _crm_fh is not None:
+        _crm_fh.flush()
+    _crm_pending = 0
+    _crm_last_flush = time.monotonic()
+
+def flush_crm_log():
+    """Flush buffered CRM lines to disk"""
+    try:
+        with _crm_lock:
+            _flush_crm_locked()
+    except Exception as e:
+        logger.error(f"❌ Error flushing CRM log: {e}")
+
+def _close_crm_locked():
+    global _crm_fh, _crm_path
+    if _crm_fh is not None:
+        try:
+            _crm_fh.close()
+        except Exception as e:
+            logger.error(f"❌ Error closing CRM log: {e}")
+        _crm_fh = None
+        _crm_path = None
+
+def close_crm_log():
+    """Flush and close the CRM log handle"""
+    with _crm_lock:
+        _close_crm_locked()
+
+def crm_log_path() -> str:
+    """Path of this process's CRM log partition for today"""
+    return f"cases-{datetime.now():%Y%m%d}-{CRM_PROCESS_TAG}.jsonl.gz"
+
+def _record_metrics(chat_data: Dict[str, Any]):
+    """Add one interaction to the running /metrics totals"""
+    with _metrics_lock:
+        _metrics_state["n"] += 1
+        _metrics_state["sum_latency"] += chat_data.get('latency_ms') or 0
+        _metrics_state["sum_tokens"] += chat_data.get('token_count') or 0
+        _metrics_state["sum_retrieval"] += chat_data.get('retrieval_score') or 0
+
+def load_metrics_state():
+    """Rebuild the running /metrics totals with one scan of the CRM log"""
+    with _metrics_lock:
+        _metrics_state.update(n=0, sum_latency=0.0, sum_tokens=0, sum_retrieval=0.0)
+    paths = sorted(glob.glob(CRM_LOG_GLOB))
+    if os.path.exists(CRM_LEGACY_LOG_PATH):
+        paths.insert(0, CRM_LEGACY_LOG_PATH)
+    
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rb") as f:
+                for line in f:
+                    if line.strip():
+                        _record_metrics(orjson.loads(line))
+        except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+            # Partition left unterminated or damaged by a crash; lines read so
+            # far still count and the remaining partitions are still loaded
+            logger.warning(f"⚠️ CRM log {path} is truncated or corrupt: {e}")
+        except Exception as e:
+            logger.error(f"❌ Error loading metrics from CRM log {path}: {e}")
 
 def log_to_crm(chat_data: Dict[str, Any]):
     """Log chat interaction to CRM-like system"""
+    global _crm_fh, _crm_path, _crm_pending
+    line = orjson.dumps(chat_data, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+    path = crm_log_path()
     try:
-        with open("cases.json", "a", encoding="utf-8") as f:
-            f.write(json.dumps(chat_data, ensure_ascii=False) + "\n")
+        with _crm_lock:
+            if _crm_path != path:
+                _close_crm_locked()
+            if _crm_fh is None:
+                _crm_fh = gzip.open(path, "ab", compresslevel=CRM_COMPRESSLEVEL)
+                _crm_path = path
+            _crm_fh.write(line)
+            _crm_pending += 1
+            if (_crm_pending >= CRM_FLUSH_EVERY
+                    or time.monotonic() - _crm_last_flush >= CRM_FLUSH_INTERVAL_S):
+                _flush_crm_locked()
         logger.info(f"✅ Logged chat interaction to CRM: {chat_data['request_id']}")
     except Exception as e:
-        logger.error(f"❌ Error logging to CRM: {e}")
+        logger.error(f"❌ Buffered CRM write failed, writing directly: {e}")
+        try:
+            # Close the failed handle first so the direct write starts a new,
+            # complete gzip member instead of landing inside an open one
+            with _crm_lock:
+                _close_crm_locked()
+                with gzip.open(path, "ab", compresslevel=CRM_COMPRESSLEVEL) as f:
+                    f.write(line)
+        except Exception as e:
+            logger.error(f"❌ Error logging to CRM: {e}")
+            return
+    _record_metrics(chat_data)
 
 def track_metrics_with_mlflow(chat_data: Dict[str, Any]):
     """Track metrics with MLflow"""
@@ -105,12 +315,33 @@ def track_metrics_with_mlflow(chat_data: Dict[str, Any]):
             if chat_data.get('retrieval_score'):
                 mlflow.log_metric("retrieval_score", chat_data['retrieval_score'])
             
-            # Log artifacts
-            mlflow.log_dict(chat_data, f"chat_data_{chat_data['request_id']}.json")
-            
         logger.info(f"✅ Tracked metrics with MLflow: {chat_data['request_id']}")
     except Exception as e:
         logger.error(f"❌ Error tracking with MLflow: {e}")
+    
+    # Buffer the raw record; it is logged with the rest of its batch
+    with _artifact_lock:
+        _artifact_buffer.append(chat_data)
+        batch_full = len(_artifact_buffer) >= ARTIFACT_BATCH_SIZE
+    if batch_full:
+        flush_chat_artifacts()
+
+def flush_chat_artifacts():
+    """Log buffered chat records to MLflow as a single artifact"""
+    with _artifact_lock:
+        batch = _artifact_buffer[:]
+        _artifact_buffer.clear()
+    if not batch:
+        return
+    
+    try:
+        batch_id = uuid.uuid4().hex
+        with mlflow.start_run(run_name=f"chat_batch_{batch_id}", nested=True):
+            mlflow.log_param("batch_size", len(batch))
+            mlflow.log_dict({"batch": batch}, f"chat_batch_{batch_id}.json")
+        logger.info(f"✅ Logged {len(batch)} chat records to MLflow")
+    except Exception as e:
+        logger.error(f"❌ Error logging chat batch to MLflow: {e}")
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
@@ -119,18 +350,19 @@ async def chat(req: ChatRequest):
         raise HTTPException(status_code=500, detail="RAG system not initialized")
     
     start_time = time.time()
-    request_id = str(uuid.uuid4())
-    session_id = req.session_id or str(uuid.uuid4())
+    request_id = uuid.uuid4().hex
+    session_id = req.session_id or uuid.uuid4().hex
     
     try:
         # Get answer from RAG system
-        result = rag_system.ask_question(req.question)
+        async with _rag_semaphore:
+            result = await run_in_threadpool(rag_system.ask_question, req.question)
         
         # Calculate latency
         latency_ms = (time.time() - start_time) * 1000
         
-        # Estimate token count (rough approximation)
-        token_count = len(req.question.split()) + len(result['answer'].split())
+        # Count tokens
+        token_count = count_tokens(req.question) + count_tokens(result['answer'])
         
         # Calculate retrieval score (simplified - based on number of sources)
         retrieval_score = len(result['sources']) / 3.0 if result['sources'] else 0.0
@@ -148,24 +380,13 @@ async def chat(req: ChatRequest):
             timestamp=datetime.now().isoformat()
         )
         
-        # Prepare CRM data
-        crm_data = {
-            "request_id": request_id,
-            "session_id": session_id,
-            "user_id": req.user_id or "anonymous",
-            "question": req.question,
-            "answer": result['answer'],
-            "sources": result['sources'],
-            "latency_ms": latency_ms,
-            "token_count": token_count,
-            "retrieval_score": retrieval_score,
-            "timestamp": response.timestamp,
-            "metadata": req.metadata or {}
-        }
+        # Prepare CRM data from the response fields plus the caller's details
+        crm_data = response.model_dump()
+        crm_data["user_id"] = req.user_id or "anonymous"
+        crm_data["metadata"] = req.metadata or {}
         
-        # Log to CRM and track with MLflow
-        log_to_crm(crm_data)
-        track_metrics_with_mlflow(crm_data)
+        # Log to CRM and track with MLflow in the background
+        enqueue_chat_record(crm_data)
         
         return response
         
@@ -186,34 +407,24 @@ async def health_check():
 async def get_metrics():
     """Get system metrics"""
     try:
-        # Read CRM data to calculate metrics
+        # Averages come from running totals kept up to date by log_to_crm, so
+        # they exclude records still queued; dropped records are never counted
         metrics = {
             "total_interactions": 0,
             "avg_latency_ms": 0,
             "avg_token_count": 0,
-            "avg_retrieval_score": 0
+            "avg_retrieval_score": 0,
+            "pending_records": _post_chat_queue.qsize() if _post_chat_queue is not None else 0,
+            "dropped_records": _post_chat_dropped
         }
         
-        latencies = []
-        token_counts = []
-        retrieval_scores = []
-        
-        try:
-            with open("cases.json", "r", encoding="utf-8") as f:
-                for line in f:
-                    if line.strip():
-                        data = json.loads(line)
-                        latencies.append(data.get('latency_ms', 0))
-                        token_counts.append(data.get('token_count', 0))
-                        retrieval_scores.append(data.get('retrieval_score', 0))
-        except FileNotFoundError:
-            pass
-        
-        if latencies:
-            metrics["total_interactions"] = len(latencies)
-            metrics["avg_latency_ms"] = sum(latencies) / len(latencies)
-            metrics["avg_token_count"] = sum(token_counts) / len(token_counts)
-            metrics["avg_retrieval_score"] = sum(retrieval_scores) / len(retrieval_scores)
+        with _metrics_lock:
+            n = _metrics_state["n"]
+            if n:
+                metrics["total_interactions"] = n
+                metrics["avg_latency_ms"] = _metrics_state["sum_latency"] / n
+                metrics["avg_token_count"] = _metrics_state["sum_tokens"] / n
+                metrics["avg_retrieval_score"] = _metrics_state["sum_retrieval"] / n
         
         return metrics
         
@@ -4,79 +4,196 @@ Generate RAG Knowledge Base from NEA Scraped Data
 Converts scraped JSON data into markdown snippets for RAG system
 """
 
-import json
+import gzip
+import hashlib
 import os
-import glob
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import re
+from itertools import chain
+import ijson
+
+# Top-level keys loaded into memory; the large arrays (statistics_tables,
+# content_sections) are streamed item by item from the file instead
+SUMMARY_KEYS = frozenset(['url', 'scraped_at', 'key_statistics', 'annual_data', 'trafilatura_metadata'])
+
+# Inputs above this size are fingerprinted by size and mtime instead of SHA-256
+INPUT_HASH_MAX_BYTES = 10 * 1024 * 1024
+
+# Snippet writes are I/O-bound and release the GIL, so oversubscribe the CPUs
+SNIPPET_WRITE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# 1 MiB buffers so the streamed index/combined KB writes reach disk in few syscalls
+KB_WRITE_BUFFER = 1 << 20
+
+SOURCE_FOOTER = "\n*Source: NEA Waste Statistics Report*\n"
+
+# Scraper output is gzip-compressed JSON; plain .json files from older runs still load
+SCRAPED_SUFFIXES = ('.json', '.json.gz')
+
+def open_scraped_file(path):
+    """Open a scraped data file for binary reading, decompressing .gz files"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def generator_fingerprint():
+    """SHA-256 of this script, so a change to the snippet code invalidates KBs
+    built by an earlier version even when the input is unchanged"""
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def write_snippet_file(item):
+    """Write one (path, bytes) snippet pair and return its path"""
+    filepath, payload = item
+    with open(filepath, 'wb') as f:
+        f.write(payload)
+    return filepath
 
 class RAGKnowledgeBaseGenerator:
     def __init__(self):
         self.raw_data_dir = "data/raw"
         self.kb_output_dir = "data/knowledge_base"
         self.snippets_dir = os.path.join(self.kb_output_dir, "snippets")
+        self.input_hash_path = os.path.join(self.kb_output_dir, ".input_hash")
+        self.data_file = None
         
         # Create directories
         os.makedirs(self.kb_output_dir, exist_ok=True)
         os.makedirs(self.snippets_dir, exist_ok=True)
     
-    def load_latest_scraped_data(self):
-        """Load the most recent scraped data file"""
-        pattern = os.path.join(self.raw_data_dir, "nea_waste_stats_*.json")
-        files = glob.glob(pattern)
-        
-        if not files:
+    def find_latest_scraped_file(self):
+        """Return the path of the most recent scraped data file, or None"""
+        # Single directory pass keeping the most recent file; DirEntry caches its stat
+        latest_file = None
+        latest_ctime = -1
+        try:
+            with os.scandir(self.raw_data_dir) as it:
+                for entry in it:
+                    if entry.name.startswith('nea_waste_stats_') and entry.name.endswith(SCRAPED_SUFFIXES) and entry.is_file():
+                        ctime = entry.stat().st_ctime
+                        if ctime > latest_ctime:
+                            latest_ctime, latest_file = ctime, entry.path
+        except FileNotFoundError:
+            pass
+        return latest_file
+    
+    def load_latest_scraped_data(self, latest_file=None):
+        """Load the summary keys of the most recent scraped data file
+        
+        The file is parsed incrementally and only SUMMARY_KEYS are built into
+        Python objects; its path is kept in self.data_file for iter_scraped_items.
+        """
+        if latest_file is None:
+            latest_file = self.find_latest_scraped_file()
+        if latest_file is None:
             print("No scraped data files found!")
             return None
         
-        # Get the most recent file
-        latest_file = max(files, key=os.path.getctime)
         print(f"Loading latest data from: {latest_file}")
-        
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        self.data_file = latest_file
+        
+        data = {}
+        key = None
+        builder = None
+        with open_scraped_file(latest_file) as f:
+            for prefix, event, value in ijson.parse(f, use_float=True):
+                if prefix == '' and event == 'map_key':
+                    key = value
+                    builder = ijson.ObjectBuilder() if key in SUMMARY_KEYS else None
+                    continue
+                if builder is None:
+                    continue
+                
+                builder.event(event, value)
+                # The value is complete once its own closing/scalar event arrives
+                if prefix == key and event not in ('start_map', 'start_array', 'map_key'):
+                    data[key] = builder.value
+                    builder = None
+        return data
+    
+    def hash_input_file(self, data_file):
+        """Fingerprint a scraped data file: SHA-256 of its bytes, or size and
+        mtime for files too large to rehash on every run"""
+        st = os.stat(data_file)
+        if st.st_size > INPUT_HASH_MAX_BYTES:
+            return f"{st.st_size}:{st.st_mtime_ns}"
+        
+        digest = hashlib.sha256()
+        with open(data_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def read_input_hash(self):
+        """Return (fingerprint, snippet file names) recorded by the last complete
+        build, or (None, []) if there is none
+        
+        The first line of .input_hash is the fingerprint; the rest name the
+        snippet files that build wrote.
+        """
+        try:
+            with open(self.input_hash_path, 'r', encoding='utf-8') as f:
+                lines = f.read().split('\n')
+        except FileNotFoundError:
+            return None, []
+        return lines[0].strip(), [name for name in lines[1:] if name]
+    
+    def outputs_present(self, snippet_names, *paths):
+        """True if the given files and every recorded snippet still exist"""
+        if not snippet_names or not all(os.path.exists(path) for path in paths):
+            return False
+        try:
+            with os.scandir(self.snippets_dir) as it:
+                present = {entry.name for entry in it}
+        except FileNotFoundError:
+            return False
+        return present.issuperset(snippet_names)
+    
+    def write_input_hash(self, input_hash, snippet_names):
+        """Record a finished build; written to a temp file and renamed into place"""
+        tmp_path = self.input_hash_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(input_hash + '\n')
+            f.writelines(name + '\n' for name in snippet_names)
+        os.replace(tmp_path, self.input_hash_path)
+    
+    def iter_scraped_items(self, data_file, key):
+        """Stream the items of a top-level array from a scraped data file"""
+        with open_scraped_file(data_file) as f:
+            yield from ijson.items(f, f'{key}.item', use_float=True)
     
     def create_statistics_snippets(self, data):
         """Create markdown snippets from statistics data"""
-        snippets = []
-        
         # Key highlights snippet
         if data.get('key_statistics', {}).get('key_highlights'):
             highlights = data['key_statistics']['key_highlights']
-            snippet = "# Key Waste Management Highlights\n\n"
+            parts = ["# Key Waste Management Highlights\n\n"]
             for highlight in highlights:
-                snippet += f"- **{highlight['metric']}**: {highlight['value']}{highlight['unit']} ({highlight['year']})\n"
-            snippet += f"\n*Source: NEA Waste Statistics Report*\n"
-            snippets.append(("key_highlights", snippet))
+                parts.append(f"- **{highlight['metric']}**: {highlight['value']}{highlight['unit']} ({highlight['year']})\n")
+            parts.append(SOURCE_FOOTER)
+            yield ("key_highlights", "".join(parts))
         
         # Recycling rates snippet
         if data.get('key_statistics', {}).get('recycling_rates'):
             rates = data['key_statistics']['recycling_rates']
-            snippet = "# Recycling Rate Trends\n\n"
+            parts = ["# Recycling Rate Trends\n\n"]
             for rate in rates:
-                snippet += f"- **{rate['metric']}**: {rate['value']}{rate['unit']} ({rate['year']})\n"
-            snippet += f"\n*Source: NEA Waste Statistics Report*\n"
-            snippets.append(("recycling_rates", snippet))
+                parts.append(f"- **{rate['metric']}**: {rate['value']}{rate['unit']} ({rate['year']})\n")
+            parts.append(SOURCE_FOOTER)
+            yield ("recycling_rates", "".join(parts))
         
         # Waste trends snippet
         if data.get('key_statistics', {}).get('waste_trends'):
             trends = data['key_statistics']['waste_trends']
-            snippet = "# Waste Generation Trends\n\n"
+            parts = ["# Waste Generation Trends\n\n"]
             for trend in trends:
-                snippet += f"- **{trend['metric']}**: {trend['value']}{trend['unit']} ({trend['year']})\n"
-            snippet += f"\n*Source: NEA Waste Statistics Report*\n"
-            snippets.append(("waste_trends", snippet))
-        
-        return snippets
+                parts.append(f"- **{trend['metric']}**: {trend['value']}{trend['unit']} ({trend['year']})\n")
+            parts.append(SOURCE_FOOTER)
+            yield ("waste_trends", "".join(parts))
     
-    def create_table_snippets(self, data):
-        """Create markdown snippets from statistics tables"""
-        snippets = []
-        
-        if not data.get('statistics_tables'):
-            return snippets
-        
-        for i, table in enumerate(data['statistics_tables']):
+    def create_table_snippets(self, data_file):
+        """Create markdown snippets from statistics tables, streamed from data_file"""
+        for i, table in enumerate(self.iter_scraped_items(data_file, 'statistics_tables')):
             title = table.get('title', f'Table {i+1}')
             headers = table.get('headers', [])
             rows = table.get('rows', [])
@@ -84,70 +201,54 @@ class RAGKnowledgeBaseGenerator:
             if not rows:
                 continue
             
-            snippet = f"# {title}\n\n"
-            
-            # Create markdown table
+            # Create markdown table, one string per line joined once at the end
+            lines = []
             if headers:
-                snippet += "| " + " | ".join(headers) + " |\n"
-                snippet += "| " + " | ".join(["---"] * len(headers)) + " |\n"
+                lines.append("| " + " | ".join(headers) + " |")
+                lines.append("| " + " | ".join(["---"] * len(headers)) + " |")
+            lines.extend(["| " + " | ".join(row) + " |" for row in rows])
             
-            for row in rows:
-                snippet += "| " + " | ".join(row) + " |\n"
-            
-            snippet += f"\n*Source: NEA Waste Statistics Report*\n"
-            snippets.append((f"table_{i+1}_{title.lower().replace(' ', '_')}", snippet))
-        
-        return snippets
+            snippet = "".join([f"# {title}\n\n", "\n".join(lines), "\n", SOURCE_FOOTER])
+            yield (f"table_{i+1}_{title.lower().replace(' ', '_')}", snippet)
     
-    def create_content_snippets(self, data):
-        """Create markdown snippets from content sections"""
-        snippets = []
-        
-        if not data.get('content_sections'):
-            return snippets
-        
-        for i, section in enumerate(data['content_sections']):
+    def create_content_snippets(self, data_file):
+        """Create markdown snippets from content sections, streamed from data_file"""
+        for i, section in enumerate(self.iter_scraped_items(data_file, 'content_sections')):
             heading = section.get('heading', f'Section {i+1}')
             content = section.get('content', [])
             
             if not content:
                 continue
             
-            snippet = f"# {heading}\n\n"
+            parts = [f"# {heading}\n\n"]
             for paragraph in content:
                 if paragraph.strip():
-                    snippet += f"{paragraph}\n\n"
+                    parts.append(f"{paragraph}\n\n")
             
-            snippet += f"*Source: NEA Waste Statistics Report*\n"
-            snippets.append((f"content_{i+1}_{heading.lower().replace(' ', '_')}", snippet))
-        
-        return snippets
+            parts.append("*Source: NEA Waste Statistics Report*\n")
+            yield (f"content_{i+1}_{heading.lower().replace(' ', '_')}", "".join(parts))
     
     def create_annual_data_snippets(self, data):
         """Create markdown snippets from annual data"""
-        snippets = []
-        
         if not data.get('annual_data'):
-            return snippets
+            return
         
         annual_data = data['annual_data']
         
         # Group by year
         for year, year_data in annual_data.items():
-            snippet = f"# Annual Waste Data - {year}\n\n"
+            parts = [f"# Annual Waste Data - {year}\n\n"]
             
             for key, value in year_data.items():
                 if key.startswith('rate_'):
-                    snippet += f"- **Recycling Rate**: {value}\n"
+                    parts.append(f"- **Recycling Rate**: {value}\n")
                 elif key.startswith('value_'):
-                    snippet += f"- **Waste Generated**: {value}\n"
+                    parts.append(f"- **Waste Generated**: {value}\n")
                 else:
-                    snippet += f"- **{key.replace('_', ' ').title()}**: {value}\n"
+                    parts.append(f"- **{key.replace('_', ' ').title()}**: {value}\n")
             
-            snippet += f"\n*Source: NEA Waste Statistics Report*\n"
-            snippets.append((f"annual_data_{year}", snippet))
-        
-        return snippets
+            parts.append(SOURCE_FOOTER)
+            yield (f"annual_data_{year}", "".join(parts))
     
     def create_metadata_snippet(self, data):
         """Create metadata snippet"""
@@ -155,96 +256,113 @@ class RAGKnowledgeBaseGenerator:
         url = data.get('url', '')
         scraped_at = data.get('scraped_at', '')
         
-        snippet = "# Document Metadata\n\n"
-        snippet += f"- **Source URL**: {url}\n"
-        snippet += f"- **Scraped At**: {scraped_at}\n"
+        parts = [
+            "# Document Metadata\n\n",
+            f"- **Source URL**: {url}\n",
+            f"- **Scraped At**: {scraped_at}\n",
+        ]
         
         if metadata.get('title'):
-            snippet += f"- **Title**: {metadata['title']}\n"
+            parts.append(f"- **Title**: {metadata['title']}\n")
         if metadata.get('author'):
-            snippet += f"- **Author**: {metadata['author']}\n"
+            parts.append(f"- **Author**: {metadata['author']}\n")
         if metadata.get('date'):
-            snippet += f"- **Publication Date**: {metadata['date']}\n"
+            parts.append(f"- **Publication Date**: {metadata['date']}\n")
         if metadata.get('language'):
-            snippet += f"- **Language**: {metadata['language']}\n"
+            parts.append(f"- **Language**: {metadata['language']}\n")
         
-        snippet += f"\n*Source: NEA Waste Statistics Report*\n"
-        return [("metadata", snippet)]
+        parts.append(SOURCE_FOOTER)
+        yield ("metadata", "".join(parts))
     
     def generate_knowledge_base(self):
-        """Generate the complete knowledge base"""
+        """Generate the complete knowledge base
+        
+        Returns True if the knowledge base was built or is already up to date.
+        """
         print("Generating RAG Knowledge Base...")
         
-        # Load scraped data
-        data = self.load_latest_scraped_data()
-        if not data:
-            return
+        latest_file = self.find_latest_scraped_file()
+        if latest_file is None:
+            print("No scraped data files found!")
+            return False
         
-        all_snippets = []
+        index_path = os.path.join(self.kb_output_dir, "index.md")
+        combined_path = os.path.join(self.kb_output_dir, "complete_knowledge_base.md")
         
-        # Generate different types of snippets
-        all_snippets.extend(self.create_metadata_snippet(data))
-        all_snippets.extend(self.create_statistics_snippets(data))
-        all_snippets.extend(self.create_table_snippets(data))
-        all_snippets.extend(self.create_content_snippets(data))
-        all_snippets.extend(self.create_annual_data_snippets(data))
+        # Skip the rebuild when the KB was already generated from this exact
+        # input by this exact generator and all of its files are still there
+        input_hash = f"{self.hash_input_file(latest_file)}:{generator_fingerprint()}"
+        stored_hash, stored_snippets = self.read_input_hash()
+        if input_hash == stored_hash and self.outputs_present(stored_snippets, index_path, combined_path):
+            print(f"Knowledge base is up to date with {latest_file}, skipping regeneration")
+            return True
         
-        # Save individual snippets
-        snippet_count = 0
-        for snippet_id, content in all_snippets:
-            filename = f"{snippet_id}.md"
-            filepath = os.path.join(self.snippets_dir, filename)
+        # Load scraped data
+        data = self.load_latest_scraped_data(latest_file)
+        if not data:
+            return False
+        
+        generated_on = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Forget the previous build before rewriting its files, so an
+        # interrupted run is never mistaken for a complete one
+        try:
+            os.remove(self.input_hash_path)
+        except FileNotFoundError:
+            pass
+        
+        # Single pass: each snippet is queued for writing, indexed and appended to the combined KB
+        snippets = chain(
+            self.create_metadata_snippet(data),
+            self.create_statistics_snippets(data),
+            self.create_table_snippets(self.data_file),
+            self.create_content_snippets(self.data_file),
+            self.create_annual_data_snippets(data),
+        )
+        with open(index_path, 'w', encoding='utf-8', buffering=KB_WRITE_BUFFER) as index_file, \
+                open(combined_path, 'w', encoding='utf-8', buffering=KB_WRITE_BUFFER) as combined_file, \
+                ThreadPoolExecutor(max_workers=SNIPPET_WRITE_WORKERS) as executor:
+            index_file.write("# NEA Waste Statistics Knowledge Base Index\n\n")
+            index_file.write(f"Generated on: {generated_on}\n\n")
+            index_file.write("## Available Snippets\n\n")
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            combined_file.write("# NEA Waste Statistics - Complete Knowledge Base\n\n")
+            combined_file.write(f"Generated on: {generated_on}\n\n")
+            combined_file.write("---\n\n")
             
-            snippet_count += 1
-            print(f"Created snippet: {filename}")
-        
-        # Create index file
-        self.create_index_file(all_snippets)
+            # Trailing separator once, so per-snippet paths are plain concatenation
+            snippet_prefix = os.path.join(self.snippets_dir, '')
+            writes = []
+            for snippet_id, content in snippets:
+                filepath = snippet_prefix + snippet_id + '.md'
+                writes.append(executor.submit(write_snippet_file, (filepath, content.encode('utf-8'))))
+                
+                # Title is the first markdown heading line of the snippet
+                first_line = content.split('\n', 1)[0]
+                title = first_line[2:] if first_line.startswith('# ') else snippet_id.replace('_', ' ').title()
+                index_file.write(f"- **{snippet_id}**: {title}\n")
+                
+                combined_file.write(content)
+                combined_file.write("\n\n---\n\n")
+            
+            snippet_names = [os.path.basename(future.result()) for future in writes]
+        # One print after the pool drains instead of one per write
+        if snippet_names:
+            print("\n".join(f"Created snippet: {name}" for name in snippet_names))
+        snippet_count = len(writes)
         
-        # Create combined knowledge base
-        self.create_combined_kb(all_snippets)
+        # Every snippet, the index and the combined KB are written and closed
+        self.write_input_hash(input_hash, snippet_names)
         
         print(f"\nKnowledge base generated successfully!")
         print(f"Total snippets created: {snippet_count}")
         print(f"Output directory: {self.kb_output_dir}")
-    
-    def create_index_file(self, snippets):
-        """Create an index file for all snippets"""
-        index_content = "# NEA Waste Statistics Knowledge Base Index\n\n"
-        index_content += f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        index_content += "## Available Snippets\n\n"
-        
-        for snippet_id, content in snippets:
-            # Extract title from content
-            title_match = re.search(r'^# (.+)$', content, re.MULTILINE)
-            title = title_match.group(1) if title_match else snippet_id.replace('_', ' ').title()
-            
-            index_content += f"- **{snippet_id}**: {title}\n"
-        
-        index_path = os.path.join(self.kb_output_dir, "index.md")
-        with open(index_path, 'w', encoding='utf-8') as f:
-            f.write(index_content)
-    
-    def create_combined_kb(self, snippets):
-        """Create a combined knowledge base file"""
-        combined_content = "# NEA Waste Statistics - Complete Knowledge Base\n\n"
-        combined_content += f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        combined_content += "---\n\n"
-        
-        for snippet_id, content in snippets:
-            combined_content += content + "\n\n---\n\n"
-        
-        combined_path = os.path.join(self.kb_output_dir, "complete_knowledge_base.md")
-        with open(combined_path, 'w', encoding='utf-8') as f:
-            f.write(combined_content)
+        return True
 
 def main():
-    """Main function"""
+    """Main function; returns True if the knowledge base is in place"""
     generator = RAGKnowledgeBaseGenerator()
-    generator.generate_knowledge_base()
+    return generator.generate_knowledge_base()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(0 if main() else 1) 
\ No newline at end of file
@@ -5,15 +5,46 @@ Scrapes waste statistics, recycling data, and trends from NEA's waste statistics
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import trafilatura
+import gzip
 import json
+try:
+    import orjson
+except ImportError:  # stdlib json fallback in save_data
+    orjson = None
 import time
 from datetime import datetime
 import os
 from urllib.parse import urljoin, urlparse
 import re
 
+# Tag groups and patterns shared by the extractors, built once at import
+_HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+_HEADING_TAG_SET = frozenset(_HEADING_TAGS)
+_TEXT_TAG_SET = frozenset(('p', 'div', 'ul', 'ol'))
+_CONTENT_CLASS_RE = re.compile(r'(content|main|body)', re.I)
+_RELEVANT_LINK_RE = re.compile(r'recycling|waste|environment|sustainability|green|statistics|report', re.I)
+_DOMESTIC_RE = re.compile(r'(\d+\.?\d*)\s*kg.*per capita.*(\d{4})', re.IGNORECASE)
+_RECYCLING_RE = re.compile(r'(\d+)\s*per cent.*recycling.*(\d{4})', re.IGNORECASE)
+_HOUSEHOLD_RE = re.compile(r'(\d+)\s*per cent.*household.*recycle.*(\d{4})', re.IGNORECASE)
+_TRAFILATURA_SKIP_FIELDS = frozenset(('body', 'commentsbody', 'raw_text', 'text'))
+_YEAR_RE = re.compile(r'(\d{4})')
+
+_TABLE_SECTION_TAGS = frozenset(('thead', 'tbody', 'tfoot'))
+
+def _table_rows(table):
+    """Return a table's own rows, without descending into nested tables"""
+    rows = []
+    for child in table.find_all(True, recursive=False):
+        if child.name == 'tr':
+            rows.append(child)
+        elif child.name in _TABLE_SECTION_TAGS:
+            rows.extend(child.find_all('tr', recursive=False))
+    return rows
+
 class NEAScraper:
     def __init__(self):
         self.base_url = "https://www.nea.gov.sg"
@@ -23,16 +54,31 @@ class NEAScraper:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         
+        # Pool keep-alive connections so follow-up fetches to nea.gov.sg reuse
+        # the TLS session, and retry transient gateway errors
+        adapter = HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
         # Create data/raw directory if it doesn't exist
         self.data_dir = "data/raw"
         os.makedirs(self.data_dir, exist_ok=True)
         
     def get_page_content(self, url):
-        """Fetch page content with error handling"""
+        """Fetch page content with error handling
+        
+        The body is streamed in 64 KiB chunks and returned as bytes; the parsers
+        detect the charset from the document, so requests' whole-body charset
+        sniffing in response.text is skipped.
+        """
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.text
+            with self.session.get(url, timeout=10, stream=True) as response:
+                response.raise_for_status()
+                return b''.join(response.iter_content(chunk_size=65536))
         except requests.RequestException as e:
             print(f"Error fetching {url}: {e}")
             return None
@@ -40,35 +86,31 @@ class NEAScraper:
     def extract_content_with_trafilatura(self, html_content, url):
         """Extract clean content using Trafilatura"""
         try:
-            # Extract main content
-            extracted_text = trafilatura.extract(html_content, url=url, output_format='text')
-            extracted_markdown = trafilatura.extract(html_content, url=url, output_format='markdown')
-            extracted_json = trafilatura.extract(html_content, url=url, output_format='json')
+            # Run the extraction pipeline once; only the plain text is used downstream
+            document = trafilatura.bare_extraction(html_content, url=url, with_metadata=True)
+            if document is None:
+                return None
             
-            # Parse JSON to get metadata
-            metadata = {}
-            if extracted_json:
-                try:
-                    metadata = json.loads(extracted_json)
-                except:
-                    pass
+            extracted_text = document.text
+            
+            # Metadata comes straight from the document; the lxml bodies are not serializable
+            metadata = {
+                key: value for key, value in document.as_dict().items()
+                if key not in _TRAFILATURA_SKIP_FIELDS
+            }
             
             return {
                 'text': extracted_text,
-                'markdown': extracted_markdown,
                 'metadata': metadata
             }
         except Exception as e:
             print(f"Error extracting content with Trafilatura: {e}")
             return None
     
-    def extract_statistics_tables(self, soup):
-        """Extract statistics tables from the waste statistics page"""
+    def extract_statistics_tables(self, table_elements):
+        """Extract statistics tables from the page's table elements"""
         tables = []
         
-        # Find all tables on the page
-        table_elements = soup.find_all('table')
-        
         for i, table in enumerate(table_elements):
             table_data = {
                 'table_index': i,
@@ -78,20 +120,20 @@ class NEAScraper:
             }
             
             # Try to find table title (look for preceding heading or caption)
-            prev_elem = table.find_previous(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'caption'])
+            prev_elem = table.find_previous([*_HEADING_TAGS, 'caption'])
             if prev_elem:
                 table_data['title'] = prev_elem.get_text(strip=True)
             
-            # Extract headers
-            header_row = table.find('tr')
+            # Extract headers from the first row and data from the rest in one walk
+            rows_iter = iter(_table_rows(table))
+            header_row = next(rows_iter, None)
             if header_row:
-                headers = header_row.find_all(['th', 'td'])
+                headers = header_row.find_all(['th', 'td'], recursive=False)
                 table_data['headers'] = [h.get_text(strip=True) for h in headers]
                 
                 # Extract data rows
-                data_rows = table.find_all('tr')[1:]  # Skip header row
-                for row in data_rows:
-                    cells = row.find_all(['td', 'th'])
+                for row in rows_iter:
+                    cells = row.find_all(['td', 'th'], recursive=False)
                     row_data = [cell.get_text(strip=True) for cell in cells]
                     if row_data:  # Only add non-empty rows
                         table_data['rows'].append(row_data)
@@ -116,8 +158,7 @@ class NEAScraper:
             
             # Look for key statistics patterns
             # Daily domestic waste per capita
-            domestic_pattern = r'(\d+\.?\d*)\s*kg.*per capita.*(\d{4})'
-            domestic_matches = re.findall(domestic_pattern, text_content, re.IGNORECASE)
+            domestic_matches = _DOMESTIC_RE.findall(text_content)
             for match in domestic_matches:
                 statistics['waste_trends'].append({
                     'metric': 'Daily domestic waste per capita',
@@ -127,8 +168,7 @@ class NEAScraper:
                 })
             
             # Overall recycling rate
-            recycling_pattern = r'(\d+)\s*per cent.*recycling.*(\d{4})'
-            recycling_matches = re.findall(recycling_pattern, text_content, re.IGNORECASE)
+            recycling_matches = _RECYCLING_RE.findall(text_content)
             for match in recycling_matches:
                 statistics['recycling_rates'].append({
                     'metric': 'Overall recycling rate',
@@ -138,8 +178,7 @@ class NEAScraper:
                 })
             
             # Household recycling participation
-            household_pattern = r'(\d+)\s*per cent.*household.*recycle.*(\d{4})'
-            household_matches = re.findall(household_pattern, text_content, re.IGNORECASE)
+            household_matches = _HOUSEHOLD_RE.findall(text_content)
             for match in household_matches:
                 statistics['key_highlights'].append({
                     'metric': 'Household recycling participation',
@@ -150,23 +189,26 @@ class NEAScraper:
         
         return statistics
     
-    def extract_annual_data(self, soup):
-        """Extract annual waste and recycling data"""
+    def extract_annual_data(self, tables):
+        """Extract annual waste and recycling data from the page's table elements"""
         annual_data = {}
         
         # Look for specific data patterns in tables
-        tables = soup.find_all('table')
         for table in tables:
             # Look for year-based data
-            rows = table.find_all('tr')
+            rows = _table_rows(table)
             for row in rows:
-                cells = row.find_all(['td', 'th'])
+                cells = row.find_all(['td', 'th'], recursive=False)
                 if len(cells) >= 2:
                     first_cell = cells[0].get_text(strip=True)
-                    # Check if first cell contains a year
-                    year_match = re.search(r'(\d{4})', first_cell)
-                    if year_match:
-                        year = year_match.group(1)
+                    # Check if first cell contains a year; it usually leads the cell,
+                    # so the regex only runs when the prefix check misses
+                    if len(first_cell) >= 4 and first_cell[:4].isdecimal():
+                        year = first_cell[:4]
+                    else:
+                        year_match = _YEAR_RE.search(first_cell)
+                        year = year_match.group(1) if year_match else None
+                    if year:
                         if year not in annual_data:
                             annual_data[year] = {}
                         
@@ -177,7 +219,7 @@ class NEAScraper:
                                 # Try to identify the data type
                                 if '%' in cell_text:
                                     annual_data[year][f'rate_{i}'] = cell_text
-                                elif re.search(r'\d+', cell_text):
+                                elif any(ch.isdecimal() for ch in cell_text):
                                     annual_data[year][f'value_{i}'] = cell_text
         
         return annual_data
@@ -194,32 +236,35 @@ class NEAScraper:
                     'content': trafilatura_content['text'].split('\n'),
                     'type': 'trafilatura_text'
                 })
-            
-            if trafilatura_content.get('markdown'):
-                content.append({
-                    'heading': 'Main Content (Markdown)',
-                    'content': trafilatura_content['markdown'].split('\n'),
-                    'type': 'trafilatura_markdown'
-                })
         
         # Method 2: Use BeautifulSoup to extract structured content
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=re.compile(r'(content|main|body)', re.I))
+        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_=_CONTENT_CLASS_RE)
         
         if main_content:
             # Extract headings and their content
-            headings = main_content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-            for heading in headings:
-                section_content = []
-                next_elem = heading.find_next_sibling()
+            headings = main_content.find_all(_HEADING_TAGS)
+            
+            # Walk the children of each heading's parent once, collecting the
+            # text blocks that follow every heading until the next one
+            sections = {}
+            visited = set()
+            for parent in (heading.parent for heading in headings):
+                if id(parent) in visited:
+                    continue
+                visited.add(id(parent))
                 
-                # Collect content until next heading
-                while next_elem and next_elem.name not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    if next_elem.name in ['p', 'div', 'ul', 'ol']:
-                        text = next_elem.get_text(strip=True)
+                section_content = None
+                for child in parent.children:
+                    name = getattr(child, 'name', None)
+                    if name in _HEADING_TAG_SET:
+                        section_content = sections[id(child)] = []
+                    elif section_content is not None and name in _TEXT_TAG_SET:
+                        text = child.get_text(strip=True)
                         if text:
                             section_content.append(text)
-                    next_elem = next_elem.find_next_sibling()
-                
+            
+            for heading in headings:
+                section_content = sections.get(id(heading))
                 if section_content:
                     content.append({
                         'heading': heading.get_text(strip=True),
@@ -235,16 +280,22 @@ class NEAScraper:
         
         # Find all links
         all_links = soup.find_all('a', href=True)
+        is_relevant = _RELEVANT_LINK_RE.search
+        base_url = self.base_url
+        seen = set()
         
         for link in all_links:
             href = link.get('href')
+            # Navigation menus repeat the same links; keep the first labelled one
+            if href in seen:
+                continue
             text = link.get_text(strip=True)
             
             if href and text:
+                seen.add(href)
                 # Filter for relevant links
-                relevant_keywords = ['recycling', 'waste', 'environment', 'sustainability', 'green', 'statistics', 'report']
-                if any(keyword in text.lower() or keyword in href.lower() for keyword in relevant_keywords):
-                    full_url = urljoin(self.base_url, href)
+                if is_relevant(text) or is_relevant(href):
+                    full_url = urljoin(base_url, href)
                     links.append({
                         'text': text,
                         'url': full_url,
@@ -262,20 +313,24 @@ class NEAScraper:
         if not html_content:
             return None
         
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html_content, 'html.parser')
+        # Parse HTML with BeautifulSoup on the C-backed lxml parser
+        soup = BeautifulSoup(html_content, 'lxml')
+        
+        # Walk the tree for tables once; both table extractors share the list
+        table_elements = soup.find_all('table')
         
         # Extract content with Trafilatura
         trafilatura_content = self.extract_content_with_trafilatura(html_content, self.target_url)
         
         # Extract different types of content
+        now = datetime.now()
         scraped_data = {
             'url': self.target_url,
-            'scraped_at': datetime.now().isoformat(),
+            'scraped_at': now.isoformat(),
             'page_title': 'Waste Statistics and Overall Recycling',
-            'statistics_tables': self.extract_statistics_tables(soup),
+            'statistics_tables': self.extract_statistics_tables(table_elements),
             'key_statistics': self.extract_key_statistics(soup, trafilatura_content),
-            'annual_data': self.extract_annual_data(soup),
+            'annual_data': self.extract_annual_data(table_elements),
             'content_sections': self.extract_content_sections(soup, trafilatura_content),
             'relevant_links': self.extract_relevant_links(soup),
             'trafilatura_metadata': trafilatura_content.get('metadata', {}) if trafilatura_content else {}
@@ -284,16 +339,24 @@ class NEAScraper:
         return scraped_data
     
     def save_data(self, data, filename=None):
-        """Save scraped data to JSON file in data/raw folder with improved naming"""
+        """Save scraped data to a gzip-compressed JSON file in data/raw folder with improved naming"""
         if not filename:
-            # Use human-readable naming convention
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
-            filename = f"nea_waste_stats_{timestamp}.json"
+            # Use human-readable naming convention, stamped with the scrape time
+            scraped_at = data.get('scraped_at')
+            now = datetime.fromisoformat(scraped_at) if scraped_at else datetime.now()
+            timestamp = now.strftime("%Y-%m-%d_%H%M%S")
+            filename = f"nea_waste_stats_{timestamp}.json.gz"
         
         filepath = os.path.join(self.data_dir, filename)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        # Compact JSON, gzip-compressed; the extracted page text compresses well
+        if orjson is not None:
+            payload = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        
+        with gzip.open(filepath, 'wb', compresslevel=6) as f:
+            f.write(payload)
         
         print(f"Data saved to: {filepath}")
         return filepath
@@ -361,7 +424,7 @@ def main():
         
         print(f"\nScraping completed successfully!")
         print(f"Data saved to: {filename}")
-        print(f"File naming convention: nea_waste_stats_YYYY-MM-DD_HHMMSS.json")
+        print(f"File naming convention: nea_waste_stats_YYYY-MM-DD_HHMMSS.json.gz")
     else:
         print("Scraping failed. Please check the URL and try again.")
 
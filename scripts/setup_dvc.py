@@ -3,16 +3,17 @@
 Setup DVC for Data Versioning
 """
 
+import shutil
 import subprocess
 import sys
 import os
 from pathlib import Path
 
 def run_command(command, description):
-    """Run a command and handle errors"""
+    """Run a command given as an argv list (no shell) and handle errors"""
     print(f"🔄 {description}...")
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
         print(f"✅ {description} completed successfully")
         if result.stdout.strip():
             print(f"   Output: {result.stdout.strip()}")
@@ -21,6 +22,10 @@ def run_command(command, description):
         print(f"❌ {description} failed:")
         print(f"   Error: {e.stderr.strip()}")
         return False
+    except FileNotFoundError:
+        print(f"❌ {description} failed:")
+        print(f"   Error: {command[0]} not found")
+        return False
 
 def main():
     """Setup DVC for data versioning"""
@@ -28,13 +33,14 @@ def main():
     print("=" * 50)
     
     # Check if DVC is installed
-    if not run_command("dvc --version", "Checking DVC installation"):
+    if shutil.which("dvc") is None:
         print("❌ DVC is not installed. Please install it first:")
         print("   pip install dvc")
         return False
+    print("✅ DVC is installed")
     
     # Initialize DVC
-    if not run_command("dvc init", "Initializing DVC"):
+    if not run_command(["dvc", "init"], "Initializing DVC"):
         return False
     
     # Add .dvc to .gitignore if not already there
@@ -55,7 +61,7 @@ def main():
     # Add raw data directory to DVC
     raw_data_path = Path("data/raw")
     if raw_data_path.exists():
-        if not run_command(f"dvc add {raw_data_path}", f"Adding {raw_data_path} to DVC"):
+        if not run_command(["dvc", "add", str(raw_data_path)], f"Adding {raw_data_path} to DVC"):
             return False
         
         # Check if .dvc file was created
@@ -70,12 +76,16 @@ def main():
         print("   Please run the scraper first to generate data")
         return False
     
-    # Add .dvc files to git
-    if not run_command("git add .dvc .gitignore", "Adding DVC files to git"):
+    # Stage all DVC files in one git add, including the data/raw.dvc pointer
+    git_paths = [".dvc", ".gitignore", str(dvc_file)]
+    data_gitignore = raw_data_path.parent / ".gitignore"
+    if data_gitignore.exists():
+        git_paths.append(str(data_gitignore))
+    if not run_command(["git", "add", *git_paths], "Adding DVC files to git"):
         return False
     
     # Commit the changes
-    if not run_command('git commit -m "Add raw docs with DVC"', "Committing DVC setup"):
+    if not run_command(["git", "commit", "-m", "Add raw docs with DVC"], "Committing DVC setup"):
         return False
     
     print("\n🎉 DVC Setup Complete!")
@@ -4,11 +4,54 @@ Setup GitHub Repository Structure
 Organizes files and prepares for GitHub commit
 """
 
+import functools
+import importlib
 import os
 import shutil
-import subprocess
 from datetime import datetime
 
+# Directories already known to exist in this process
+_dir_cache = set()
+
+def ensure_directory(directory):
+    """Create directory if needed; a single isdir stat on re-runs, free on repeats"""
+    if directory in _dir_cache:
+        return
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    _dir_cache.add(directory)
+
+@functools.lru_cache(maxsize=256)
+def _dir_entries(directory):
+    """Names in directory, listed once per process; a missing directory is
+    cached as empty so its children are rejected without further syscalls"""
+    try:
+        with os.scandir(directory) as it:
+            return frozenset(entry.name for entry in it)
+    except FileNotFoundError:
+        return frozenset()
+
+# Static text (gitignore rules, project tree) kept in the templates directory
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+@functools.lru_cache(maxsize=None)
+def _res(name):
+    """Bytes of a templates/ file, read once per process with LF line endings"""
+    with open(os.path.join(TEMPLATES_DIR, name), 'rb') as f:
+        return f.read().replace(b'\r\n', b'\n')
+
+def write_if_changed(path, data):
+    """Write bytes to path unless it already holds exactly them; returns True if written"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
 class GitHubSetup:
     def __init__(self):
         self.project_root = "."
@@ -23,7 +66,7 @@ class GitHubSetup:
         print("Creating directory structure...")
         
         for directory in self.directories:
-            os.makedirs(directory, exist_ok=True)
+            ensure_directory(directory)
             print(f"✅ Created: {directory}")
     
     def check_file_structure(self):
@@ -40,9 +83,11 @@ class GitHubSetup:
             "docs/service_blueprint.md"
         ]
         
+        # One cached scandir per parent directory instead of one stat per file
         missing_files = []
         for file_path in required_files:
-            if not os.path.exists(file_path):
+            directory, name = os.path.split(file_path)
+            if name not in _dir_entries(directory or "."):
                 missing_files.append(file_path)
             else:
                 print(f"✅ Found: {file_path}")
@@ -53,104 +98,57 @@ class GitHubSetup:
         
         return True
     
+    def run_step(self, module_name, func_name):
+        """Import a sibling script and call one of its functions in this process
+        
+        Reuses the interpreter and modules already loaded instead of starting a
+        new Python. Returns the function's result, or the exception it raised
+        (including a failed import). SystemExit is returned too, so a sys.exit()
+        in the script fails only its step, as a non-zero exit code used to.
+        """
+        try:
+            module = importlib.import_module(module_name)
+            return getattr(module, func_name)()
+        except (Exception, SystemExit) as e:
+            return e
+    
     def generate_rag_knowledge_base(self):
         """Generate the RAG knowledge base from scraped data"""
         print("\nGenerating RAG Knowledge Base...")
         
-        try:
-            result = subprocess.run(['python', 'generate_rag_kb.py'], 
-                                  capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                print("✅ RAG Knowledge Base generated successfully")
-                return True
-            else:
-                print(f"❌ Error generating RAG KB: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error running RAG generation: {e}")
+        # generate_rag_kb.main() returns True once the KB is built or up to date
+        result = self.run_step('generate_rag_kb', 'main')
+        if isinstance(result, BaseException):
+            print(f"❌ Error generating RAG KB: {result!r}")
             return False
+        if result is not True:
+            print("❌ RAG Knowledge Base was not generated")
+            return False
+        
+        print("✅ RAG Knowledge Base generated successfully")
+        return True
     
     def convert_blueprint_to_pdf(self):
         """Convert service blueprint to PDF"""
         print("\nConverting Service Blueprint to PDF...")
         
-        try:
-            result = subprocess.run(['python', 'convert_to_pdf.py'], 
-                                  capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                print("✅ PDF conversion completed")
-                return True
-            else:
-                print(f"⚠️  PDF conversion failed, but HTML version created")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Error running PDF conversion: {e}")
-            return False
+        result = self.run_step('convert_to_pdf', 'convert_markdown_to_pdf')
+        if result is True:
+            print("✅ PDF conversion completed")
+            return True
+        
+        if isinstance(result, BaseException):
+            print(f"❌ Error running PDF conversion: {result!r}")
+        else:
+            print(f"⚠️  PDF conversion failed, but HTML version created")
+        return False
     
     def create_gitignore(self):
-        """Create .gitignore file"""
-        gitignore_content = """# Python
-__pycache__/
-*.py[cod]
-*$py.class
-*.so
-.Python
-build/
-develop-eggs/
-dist/
-downloads/
-eggs/
-.eggs/
-lib/
-lib64/
-parts/
-sdist/
-var/
-wheels/
-*.egg-info/
-.installed.cfg
-*.egg
-MANIFEST
-
-# Virtual environments
-venv/
-env/
-ENV/
-
-# IDE
-.vscode/
-.idea/
-*.swp
-*.swo
-
-# OS
-.DS_Store
-Thumbs.db
-
-# Logs
-*.log
-
-# Temporary files
-*.tmp
-*.temp
-
-# Data files (uncomment if you don't want to commit data)
-# data/raw/*.json
-# data/knowledge_base/
-
-# Keep the directory structure but ignore content
-data/raw/.gitkeep
-data/knowledge_base/.gitkeep
-"""
-        
-        with open('.gitignore', 'w') as f:
-            f.write(gitignore_content)
-        
-        print("✅ Created .gitignore file")
+        """Create .gitignore file (left untouched when already up to date)"""
+        if write_if_changed('.gitignore', _res('gitignore.txt')):
+            print("✅ Created .gitignore file")
+        else:
+            print("✅ .gitignore already up to date")
     
     def create_gitkeep_files(self):
         """Create .gitkeep files to preserve empty directories"""
@@ -159,10 +157,15 @@ data/knowledge_base/.gitkeep
             "data/knowledge_base/snippets"
         ]
         
+        payload = b"# This file ensures the directory is tracked by Git\n"
         for directory in gitkeep_dirs:
             gitkeep_file = os.path.join(directory, ".gitkeep")
-            with open(gitkeep_file, 'w') as f:
-                f.write("# This file ensures the directory is tracked by Git\n")
+            # Raw fd write; skips the buffered io object for a one-line file
+            fd = os.open(gitkeep_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.write(fd, payload)
+            finally:
+                os.close(fd)
             print(f"✅ Created: {gitkeep_file}")
     
     def show_commit_instructions(self):
@@ -194,38 +197,7 @@ data/knowledge_base/.gitkeep
     
     def print_project_structure(self):
         """Print the project structure"""
-        structure = """
-RecycleBot-Lite/
-├── scrape.py                          # Main scraper script
-├── generate_rag_kb.py                 # RAG knowledge base generator
-├── convert_to_pdf.py                  # PDF conversion script
-├── setup_github.py                    # This setup script
-├── requirements.txt                   # Python dependencies
-├── README.md                          # Project documentation
-├── thinking_process.txt               # Development decision log
-├── .gitignore                         # Git ignore rules
-├── data/
-│   ├── raw/                           # Scraped JSON data
-│   │   ├── .gitkeep
-│   │   └── nea_waste_stats_*.json     # Scraped data files
-│   └── knowledge_base/                # RAG knowledge base
-│       ├── snippets/                  # Individual markdown snippets
-│       │   ├── .gitkeep
-│       │   ├── metadata.md
-│       │   ├── key_highlights.md
-│       │   ├── recycling_rates.md
-│       │   ├── waste_trends.md
-│       │   ├── table_*.md
-│       │   ├── content_*.md
-│       │   └── annual_data_*.md
-│       ├── index.md                   # Snippet index
-│       └── complete_knowledge_base.md # Combined knowledge base
-└── docs/
-    ├── service_blueprint.md           # Service blueprint (markdown)
-    ├── blueprint.pdf                  # Service blueprint (PDF)
-    └── blueprint.html                 # Service blueprint (HTML fallback)
-"""
-        print(structure)
+        print("\n" + _res('project_structure.txt').decode('utf-8'))
     
     def run_setup(self):
         """Run the complete setup process"""
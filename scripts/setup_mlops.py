@@ -3,23 +3,74 @@
 Complete MLOps Setup for NEA RAG System
 """
 
+import importlib.util
+import shutil
 import subprocess
+import textwrap
 import sys
 import os
 from pathlib import Path
 
-def run_command(command, description, check_output=False):
-    """Run a command and handle errors"""
+# Distribution names whose import name differs from the dashed-to-underscore form
+IMPORT_NAMES = {"faiss-cpu": "faiss"}
+
+_NEXT_STEPS_MSG = textwrap.dedent("""\
+    [INFO] Next Steps:
+
+    1. Start FastAPI server:
+       python fastapi_rag.py
+       # or
+       bash start_fastapi.sh
+
+    2. Start MLflow UI (in another terminal):
+       mlflow ui
+       # or
+       bash start_mlflow.sh
+       # Then visit: http://localhost:5000
+
+    3. Run test questions:
+       python test_mlflow_tracking.py
+       # or
+       bash run_tests.sh
+
+    4. Check CRM logs:
+       zcat cases-*.jsonl.gz
+
+    5. API Documentation:
+       http://localhost:8000/docs
+
+    6. Data versioning:
+       dvc status
+       dvc list .
+
+    Metrics tracked:
+       - Latency (ms)
+       - Token count
+       - Retrieval score
+       - Number of sources
+       - User sessions
+
+    Data lineage:
+       - Raw data versioned with DVC
+       - Experiments tracked with MLflow
+       - Chat interactions logged to CRM
+""")
+
+def run_command(argv, description, check_output=False):
+    """Run a command given as an argv list (no shell) and handle errors
+    
+    Returns a (success, output) tuple.
+    """
     print(f"[STEP] {description}...")
     try:
         if check_output:
-            result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+            result = subprocess.run(argv, check=True, capture_output=True, text=True)
             print(f"[OK] {description} completed successfully")
             if result.stdout.strip():
                 print(f"   Output: {result.stdout.strip()}")
             return True, result.stdout.strip()
         else:
-            result = subprocess.run(command, shell=True, check=True)
+            result = subprocess.run(argv, check=True)
             print(f"[OK] {description} completed successfully")
             return True, None
     except subprocess.CalledProcessError as e:
@@ -27,6 +78,36 @@ def run_command(command, description, check_output=False):
         if e.stderr:
             print(f"   Error: {e.stderr.strip()}")
         return False, None
+    except FileNotFoundError:
+        print(f"[ERROR] {description} failed:")
+        print(f"   Error: {argv[0]} not found")
+        return False, None
+
+def has_match(dirpath, suffix):
+    """Return True if dirpath holds a file ending in suffix, stopping at the first
+    
+    A single scandir pass; a missing directory simply has no matches.
+    """
+    try:
+        with os.scandir(dirpath) as it:
+            return any(entry.name.endswith(suffix) and entry.is_file() for entry in it)
+    except FileNotFoundError:
+        return False
+
+def write_text_if_changed(path, content):
+    """Write text content to path as UTF-8 unless the file already holds exactly that
+    
+    Re-running setup then leaves unchanged files (and their mtimes) alone.
+    """
+    path = Path(path)
+    data = content.encode("utf-8")
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    path.write_bytes(data)
+    return True
 
 def check_python_packages():
     """Check if required Python packages are installed"""
@@ -35,15 +116,12 @@ def check_python_packages():
         "requests", "langchain", "faiss-cpu", "ollama"
     ]
     
-    missing_packages = []
-    
-    for package in required_packages:
-        try:
-            __import__(package.replace("-", "_"))
-        except ImportError:
-            missing_packages.append(package)
-    
-    return missing_packages
+    # find_spec only locates each module; importing them would run their
+    # (heavy) top-level code just to test presence
+    return [
+        package for package in required_packages
+        if importlib.util.find_spec(IMPORT_NAMES.get(package, package.replace("-", "_"))) is None
+    ]
 
 def main():
     """Complete MLOps setup"""
@@ -58,7 +136,7 @@ def main():
         print(f"[WARN] Missing packages: {', '.join(missing_packages)}")
         print("Installing from requirements.txt...")
         
-        if not run_command("pip install -r requirements.txt", "Installing requirements"):
+        if not run_command([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"], "Installing requirements")[0]:
             print("[ERROR] Failed to install requirements. Please install manually:")
             print("   pip install -r requirements.txt")
             return False
@@ -67,14 +145,17 @@ def main():
     
     # Step 2: Setup DVC
     print("\n[STEP] Step 2: Setting up DVC...")
-    if not run_command("dvc --version", "Checking DVC installation", check_output=True)[0]:
+    # A PATH lookup answers "is dvc installed?" without starting the CLI
+    if shutil.which("dvc") is not None:
+        print("[OK] DVC is installed")
+    else:
         print("[ERROR] DVC not found. Installing...")
-        if not run_command("pip install dvc", "Installing DVC"):
+        if not run_command([sys.executable, "-m", "pip", "install", "dvc"], "Installing DVC")[0]:
             return False
     
     # Initialize DVC if not already initialized
     if not Path(".dvc").exists():
-        if not run_command("dvc init", "Initializing DVC"):
+        if not run_command(["dvc", "init"], "Initializing DVC")[0]:
             return False
     
     # Step 3: Setup MLflow
@@ -88,21 +169,22 @@ def main():
     raw_data_path = Path("data/raw")
     knowledge_base_path = Path("data/knowledge_base/snippets")
     
-    if not raw_data_path.exists() or not list(raw_data_path.glob("*.json")):
+    has_raw_data = has_match(raw_data_path, (".json", ".json.gz"))
+    if not has_raw_data:
         print("[WARN] No raw data found. Please run the scraper first:")
         print("   python scrape.py")
         print("   python generate_rag_kb.py")
     
-    if not knowledge_base_path.exists() or not list(knowledge_base_path.glob("*.md")):
+    if not has_match(knowledge_base_path, ".md"):
         print("[WARN] No knowledge base found. Please generate it:")
         print("   python generate_rag_kb.py")
     
     # Step 5: Setup DVC tracking for raw data
     print("\n[STEP] Step 5: Setting up DVC tracking...")
-    if raw_data_path.exists() and list(raw_data_path.glob("*.json")):
+    if has_raw_data:
         dvc_file = raw_data_path.with_suffix('.dvc')
         if not dvc_file.exists():
-            if not run_command(f"dvc add {raw_data_path}", f"Adding {raw_data_path} to DVC"):
+            if not run_command(["dvc", "add", str(raw_data_path)], f"Adding {raw_data_path} to DVC")[0]:
                 print("[WARN] DVC add failed, but continuing...")
     
     # Step 6: Create necessary directories
@@ -114,8 +196,11 @@ def main():
     ]
     
     for directory in directories:
-        Path(directory).mkdir(exist_ok=True)
-        print(f"[OK] Created directory: {directory}")
+        try:
+            os.mkdir(directory)
+        except FileExistsError:
+            pass
+    print(f"[OK] Ensured directories: {', '.join(directories)}")
     
     # Step 7: Create startup scripts
     print("\n[STEP] Step 7: Creating startup scripts...")
@@ -123,63 +208,23 @@ def main():
     # FastAPI startup script
     fastapi_script = "#!/bin/bash\necho 'Starting FastAPI RAG Server...'\necho 'MLflow UI will be available at: http://localhost:5000'\necho 'FastAPI docs will be available at: http://localhost:8000/docs'\necho ''\npython scripts/fastapi_rag.py\n"
     
-    with open("start_fastapi.sh", "w") as f:
-        f.write(fastapi_script)
+    write_text_if_changed("start_fastapi.sh", fastapi_script)
     
     # MLflow UI startup script
     mlflow_script = "#!/bin/bash\necho 'Starting MLflow UI...'\necho 'MLflow UI will be available at: http://localhost:5000'\necho ''\nmlflow ui --host 0.0.0.0 --port 5000\n"
     
-    with open("start_mlflow.sh", "w") as f:
-        f.write(mlflow_script)
+    write_text_if_changed("start_mlflow.sh", mlflow_script)
     
     # Test script
     test_script = "#!/bin/bash\necho 'Running MLflow tracking tests...'\necho 'Make sure FastAPI server is running first!'\necho ''\npython scripts/test_mlflow_tracking.py\n"
     
-    with open("run_tests.sh", "w") as f:
-        f.write(test_script)
+    write_text_if_changed("run_tests.sh", test_script)
     
     print("[OK] Created startup scripts")
     
-    # Step 8: Final instructions
-    print("\n[INFO] Next Steps:")
-    print("")
-    print("1. Start FastAPI server:")
-    print("   python fastapi_rag.py")
-    print("   # or")
-    print("   bash start_fastapi.sh")
-    print("")
-    print("2. Start MLflow UI (in another terminal):")
-    print("   mlflow ui")
-    print("   # or")
-    print("   bash start_mlflow.sh")
-    print("   # Then visit: http://localhost:5000")
-    print("")
-    print("3. Run test questions:")
-    print("   python test_mlflow_tracking.py")
-    print("   # or")
-    print("   bash run_tests.sh")
-    print("")
-    print("4. Check CRM logs:")
-    print("   cat cases.json")
-    print("")
-    print("5. API Documentation:")
-    print("   http://localhost:8000/docs")
-    print("")
-    print("6. Data versioning:")
-    print("   dvc status")
-    print("   dvc list .")
-    print("")
-    print("Metrics tracked:")
-    print("   - Latency (ms)")
-    print("   - Token count")
-    print("   - Retrieval score")
-    print("   - Number of sources")
-    print("   - User sessions")
-    print("")
-    print("Data lineage:")
-    print("   - Raw data versioned with DVC")
-    print("   - Experiments tracked with MLflow")
-    print("   - Chat interactions logged to CRM")
+    # Step 8: Final instructions, emitted in one write
+    sys.stdout.write("\n" + _NEXT_STEPS_MSG)
+    sys.stdout.flush()
     
     return True
 
@@ -5,8 +5,10 @@ Test MLflow Tracking with Five Test Questions
 
 import requests
 import json
+import operator
 import time
 import sys
+import textwrap
 import os
 from datetime import datetime
 
@@ -25,7 +27,18 @@ TEST_QUESTIONS = [
     "How has waste generation changed over the years?"
 ]
 
-def test_question(question: str, question_num: int):
+_SUMMARY_FIELDS = operator.itemgetter('latency_ms', 'token_count', 'retrieval_score', 'sources_count')
+
+FOLLOW_UP_MSG = textwrap.dedent("""
+    🔍 Check MLflow UI for detailed tracking:
+       mlflow ui
+       Then visit: http://localhost:5000
+
+    [INFO] Check CRM logs:
+       zcat cases-*.jsonl.gz
+""")
+
+def test_question(session: requests.Session, question: str, question_num: int):
     """Test a single question and return metrics"""
     print(f"\n--- Testing Question {question_num}: {question} ---")
     
@@ -43,7 +56,7 @@ def test_question(question: str, question_num: int):
     try:
         # Make request
         start_time = time.time()
-        response = requests.post(f"{API_BASE_URL}/chat", json=payload)
+        response = session.post(f"{API_BASE_URL}/chat", json=payload)
         request_time = time.time() - start_time
         
         if response.status_code == 200:
@@ -91,9 +104,12 @@ def main():
     print(f"📅 Test started at: {datetime.now().isoformat()}")
     print(f"🎯 Testing {len(TEST_QUESTIONS)} questions")
     
+    # One keep-alive session shared by the health check and all questions
+    session = requests.Session()
+    
     # Check if server is running
     try:
-        health_response = requests.get(f"{API_BASE_URL}/health")
+        health_response = session.get(f"{API_BASE_URL}/health")
         if health_response.status_code != 200:
             print("[ERROR] FastAPI server is not running. Please start it first:")
             print("   python fastapi_rag.py")
@@ -104,30 +120,38 @@ def main():
         print("   python fastapi_rag.py")
         return
     
-    # Run all test questions
-    results = []
-    for i, question in enumerate(TEST_QUESTIONS, 1):
-        result = test_question(question, i)
-        results.append(result)
-        time.sleep(1)  # Small delay between requests
+    # Ask the questions one at a time: /chat answers them serially anyway, and
+    # a queued request's latency_ms would include its wait behind the others
+    results = [test_question(session, question, i) for i, question in enumerate(TEST_QUESTIONS, 1)]
     
     # Calculate summary statistics
     successful_results = [r for r in results if r['success']]
     
     if successful_results:
-        avg_latency = sum(r['latency_ms'] for r in successful_results) / len(successful_results)
-        avg_tokens = sum(r['token_count'] for r in successful_results) / len(successful_results)
-        avg_retrieval = sum(r['retrieval_score'] for r in successful_results) / len(successful_results)
-        avg_sources = sum(r['sources_count'] for r in successful_results) / len(successful_results)
+        # Accumulate all four totals in one pass over the results
+        total_latency = total_tokens = total_retrieval = total_sources = 0.0
+        for latency, tokens, retrieval, sources in map(_SUMMARY_FIELDS, successful_results):
+            total_latency += latency
+            total_tokens += tokens
+            total_retrieval += retrieval
+            total_sources += sources
+        
+        n = len(successful_results)
+        avg_latency = total_latency / n
+        avg_tokens = total_tokens / n
+        avg_retrieval = total_retrieval / n
+        avg_sources = total_sources / n
         
-        print(f"\n[INFO] Test Summary:")
-        print(f"   Total Questions: {len(results)}")
-        print(f"   Successful: {len(successful_results)}")
-        print(f"   Failed: {len(results) - len(successful_results)}")
-        print(f"   Average Latency: {avg_latency:.2f} ms")
-        print(f"   Average Token Count: {avg_tokens:.1f}")
-        print(f"   Average Retrieval Score: {avg_retrieval:.3f}")
-        print(f"   Average Sources: {avg_sources:.1f}")
+        sys.stdout.write(
+            f"\n[INFO] Test Summary:\n"
+            f"   Total Questions: {len(results)}\n"
+            f"   Successful: {len(successful_results)}\n"
+            f"   Failed: {len(results) - len(successful_results)}\n"
+            f"   Average Latency: {avg_latency:.2f} ms\n"
+            f"   Average Token Count: {avg_tokens:.1f}\n"
+            f"   Average Retrieval Score: {avg_retrieval:.3f}\n"
+            f"   Average Sources: {avg_sources:.1f}\n"
+        )
         
         # Save results to file
         test_results = {
@@ -145,19 +169,16 @@ def main():
         }
         
         with open("mlflow_test_results.json", "w", encoding="utf-8") as f:
-            json.dump(test_results, f, indent=2, ensure_ascii=False)
+            # Compact output; pipe through `python -m json.tool` to read it
+            json.dump(test_results, f, ensure_ascii=False, separators=(",", ":"))
         
         print(f"\n[OK] Results saved to: mlflow_test_results.json")
         
     else:
         print("[ERROR] No successful tests to summarize")
     
-    print(f"\n🔍 Check MLflow UI for detailed tracking:")
-    print(f"   mlflow ui")
-    print(f"   Then visit: http://localhost:5000")
-    
-    print(f"\n[INFO] Check CRM logs:")
-    print(f"   cat cases.json")
+    sys.stdout.write(FOLLOW_UP_MSG)
+    sys.stdout.flush()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
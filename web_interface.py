@@ -4,13 +4,24 @@ Web Interface for NEA RAG System
 Simple Flask web app for interacting with the RAG system
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import json
 import os
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
 
-# Add current directory to path for imports
-sys.path.append(str(Path(__file__).parent))
+# Add current directory to path for imports (once, even across reloads)
+_here = str(Path(__file__).parent)
+if _here not in sys.path:
+    sys.path.append(_here)
+
+try:
+    from waitress import serve
+except ImportError:  # fall back to the threaded Werkzeug server in main()
+    serve = None
 
 try:
     from rag_system import NEARAGSystem, test_ollama_connection
@@ -21,15 +32,57 @@ except ImportError as e:
 
 app = Flask(__name__)
 
-# Global RAG system instance
+# Static page assets kept alongside the blueprint template
+TEMPLATES_DIR = Path(__file__).parent / 'templates'
+
+# Index page served at /, read once at import
+try:
+    _INDEX_HTML_BYTES = (TEMPLATES_DIR / 'index.html').read_bytes()
+except OSError as e:
+    print(f"Error loading the web page template: {e}")
+    print(f"Please ensure {TEMPLATES_DIR / 'index.html'} exists (it ships with the repository)")
+    sys.exit(1)
+
+# Global RAG system instance, loaded in the background; _ready is set once it can answer
 rag_system = None
+_ready = threading.Event()
+# Held while an initialization runs, so the poller can't start a second one
+_init_lock = threading.Lock()
+
+# Requests are served on several threads, but the QA chain shares one
+# conversation memory and retriever cache, so RAG calls run one at a time
+_rag_lock = threading.Lock()
+# Status and answer streams each hold a thread while open
+SERVER_THREADS = 16
+
+# Ollama reachability, refreshed by a background poller so /api/status
+# answers from memory instead of making a network call per request
+OLLAMA_POLL_SECONDS = 60
+_ollama_ok = False
+
+# Status changes are pushed to /api/status/stream clients; the version bumps on
+# every change and the condition wakes the waiting streams. Each stream ends
+# after STATUS_STREAM_SECONDS (EventSource reconnects on its own) and at most
+# MAX_STATUS_STREAMS run at once, so open tabs can't take every server thread;
+# pages turned away fall back to polling /api/status
+STATUS_KEEPALIVE_SECONDS = 25
+STATUS_STREAM_SECONDS = 120
+MAX_STATUS_STREAMS = SERVER_THREADS // 4
+_status_stream_slots = threading.BoundedSemaphore(MAX_STATUS_STREAMS)
+_status_changed = threading.Condition()
+_status_version = 0
+
+NOT_READY_ERROR = 'RAG system is not ready yet. It may still be loading; otherwise check the Ollama installation.'
 
 def initialize_rag_system():
     """Initialize the RAG system"""
-    global rag_system
+    global rag_system, _ollama_ok
     try:
         if test_ollama_connection():
+            _ollama_ok = True
             rag_system = NEARAGSystem()
+            _ready.set()
+            publish_status()
             return True
         else:
             return False
@@ -37,18 +90,81 @@ def initialize_rag_system():
         print(f"Error initializing RAG system: {e}")
         return False
 
+def initialize_in_background():
+    """Thread target: initialize the RAG system and report the outcome
+    
+    Returns at once if another initialization is already running.
+    """
+    if not _init_lock.acquire(blocking=False):
+        return
+    try:
+        if initialize_rag_system():
+            print("✅ RAG system initialized successfully")
+        else:
+            print("❌ Failed to initialize RAG system")
+            print("Please ensure:")
+            print("1. Ollama is installed and running")
+            print("2. Llama3 model is pulled: ollama pull llama3")
+            print("3. All dependencies are installed: pip install -r requirements.txt")
+            print("Initialization is retried when Ollama comes up.")
+    finally:
+        _init_lock.release()
+
+def publish_status():
+    """Wake status streams after a status flag changed"""
+    global _status_version
+    with _status_changed:
+        _status_version += 1
+        _status_changed.notify_all()
+
+def current_status():
+    """Status payload built from the flags kept by the background threads"""
+    ollama_running = _ollama_ok
+    rag_ready = _ready.is_set()
+    
+    return {
+        'ollama_running': ollama_running,
+        'rag_system_ready': rag_ready,
+        'status': 'ready' if (ollama_running and rag_ready) else 'not_ready'
+    }
+
+def poll_ollama():
+    """Thread target: re-probe Ollama every OLLAMA_POLL_SECONDS
+    
+    When Ollama comes up and the RAG system isn't ready (e.g. Ollama was down
+    at startup), initialization is started again.
+    """
+    global _ollama_ok
+    while True:
+        try:
+            ollama_ok = bool(test_ollama_connection())
+        except Exception:
+            ollama_ok = False
+        if ollama_ok != _ollama_ok:
+            _ollama_ok = ollama_ok
+            publish_status()
+            if ollama_ok and not _ready.is_set():
+                threading.Thread(target=initialize_in_background, daemon=True).start()
+        time.sleep(OLLAMA_POLL_SECONDS)
+
 @app.route('/')
 def index():
-    """Main page"""
-    return render_template('index.html')
+    """Main page, sent straight from the pre-encoded bytes (no Jinja render)
+    
+    A fresh Response wraps the shared bytes on each request, since Flask may
+    modify the returned response object.
+    """
+    return Response(_INDEX_HTML_BYTES, mimetype='text/html')
 
 @app.route('/api/ask', methods=['POST'])
 def ask_question():
-    """API endpoint for asking questions"""
-    if rag_system is None:
-        return jsonify({
-            'error': 'RAG system not initialized. Please check Ollama installation.'
-        }), 500
+    """API endpoint for asking questions
+    
+    The answer is streamed as Server-Sent Events: one data event per token,
+    then a "done" event carrying the full response (or an error).
+    """
+    if not _ready.is_set():
+        return jsonify({'error': NOT_READY_ERROR}), 503
     
     try:
         data = request.get_json()
@@ -59,40 +175,78 @@ def ask_question():
         
         # Get chat history from request
         chat_history = data.get('chat_history', [])
-        
-        # Ask question
-        response = rag_system.ask_question(question, chat_history)
-        
-        return jsonify(response)
-        
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    # The chain runs on its own thread and feeds tokens through a queue; the
+    # final response dict marks the end of the stream
+    events = queue.Queue()
+    
+    def answer():
+        try:
+            with _rag_lock:
+                response = rag_system.ask_question(question, chat_history, on_token=events.put)
+        except Exception as e:
+            response = {'error': str(e)}
+        events.put(response)
+    
+    def stream():
+        while True:
+            item = events.get()
+            if isinstance(item, dict):
+                yield f"event: done\ndata: {json.dumps(item)}\n\n"
+                return
+            yield f"data: {json.dumps(item)}\n\n"
+    
+    threading.Thread(target=answer, daemon=True).start()
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
 
 @app.route('/api/status')
 def status():
-    """Check system status"""
-    try:
-        ollama_running = test_ollama_connection()
-        rag_ready = rag_system is not None
-        
-        return jsonify({
-            'ollama_running': ollama_running,
-            'rag_system_ready': rag_ready,
-            'status': 'ready' if (ollama_running and rag_ready) else 'not_ready'
-        })
-    except Exception as e:
-        return jsonify({
-            'ollama_running': False,
-            'rag_system_ready': False,
-            'status': 'error',
-            'error': str(e)
-        })
+    """Check system status from the flags kept by the background threads"""
+    return jsonify(current_status())
+
+@app.route('/api/status/stream')
+def status_stream():
+    """Server-Sent Events stream that pushes the status when it changes
+    
+    The current status is sent on connect; comment lines keep idle connections
+    alive and let the server notice closed tabs. The stream closes after
+    STATUS_STREAM_SECONDS, and 503 is returned while MAX_STATUS_STREAMS are open.
+    """
+    if not _status_stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many status streams, poll /api/status instead'}), 503
+    
+    def stream():
+        seen_version = None
+        deadline = time.monotonic() + STATUS_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            with _status_changed:
+                _status_changed.wait_for(lambda: _status_version != seen_version,
+                                         timeout=min(STATUS_KEEPALIVE_SECONDS, remaining))
+                changed = _status_version != seen_version
+                seen_version = _status_version
+            if changed:
+                yield f"data: {json.dumps(current_status())}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+    
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    # Runs when the server closes the response, even if the client left
+    # before the stream started
+    response.call_on_close(_status_stream_slots.release)
+    return response
 
 @app.route('/api/similar', methods=['POST'])
 def get_similar():
     """Get similar documents"""
-    if rag_system is None:
-        return jsonify({'error': 'RAG system not initialized'}), 500
+    if not _ready.is_set():
+        return jsonify({'error': NOT_READY_ERROR}), 503
     
     try:
         data = request.get_json()
@@ -102,295 +256,42 @@ def get_similar():
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
-        docs = rag_system.get_similar_documents(query, k)
+        with _rag_lock:
+            docs = rag_system.get_similar_documents(query, k)
         
         # Format documents for response
-        formatted_docs = []
-        for doc in docs:
-            formatted_docs.append({
-                'content': doc.page_content[:500] + '...' if len(doc.page_content) > 500 else doc.page_content,
+        formatted_docs = [
+            {
+                'content': doc.page_content[:500] + ('...' if len(doc.page_content) > 500 else ''),
                 'source': doc.metadata.get('source', 'Unknown')
-            })
+            }
+            for doc in docs
+        ]
         
         return jsonify({'documents': formatted_docs})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Create templates directory and HTML template
-def create_templates():
-    """Create templates directory and HTML template"""
-    templates_dir = Path('templates')
-    templates_dir.mkdir(exist_ok=True)
-    
-    html_template = '''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>NEA Waste Management RAG System</title>
-    <style>
-        body {
-            font-family: Arial, sans-serif;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }
-        .container {
-            background-color: white;
-            padding: 30px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-        }
-        h1 {
-            color: #2c3e50;
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        .status {
-            padding: 10px;
-            border-radius: 5px;
-            margin-bottom: 20px;
-            text-align: center;
-        }
-        .status.ready {
-            background-color: #d4edda;
-            color: #155724;
-            border: 1px solid #c3e6cb;
-        }
-        .status.not-ready {
-            background-color: #f8d7da;
-            color: #721c24;
-            border: 1px solid #f5c6cb;
-        }
-        .chat-container {
-            border: 1px solid #ddd;
-            border-radius: 5px;
-            height: 400px;
-            overflow-y: auto;
-            padding: 15px;
-            margin-bottom: 20px;
-            background-color: #fafafa;
-        }
-        .message {
-            margin-bottom: 15px;
-            padding: 10px;
-            border-radius: 5px;
-        }
-        .user-message {
-            background-color: #007bff;
-            color: white;
-            margin-left: 20%;
-        }
-        .bot-message {
-            background-color: #e9ecef;
-            color: #333;
-            margin-right: 20%;
-        }
-        .input-container {
-            display: flex;
-            gap: 10px;
-        }
-        #question-input {
-            flex: 1;
-            padding: 10px;
-            border: 1px solid #ddd;
-            border-radius: 5px;
-            font-size: 16px;
-        }
-        button {
-            padding: 10px 20px;
-            background-color: #007bff;
-            color: white;
-            border: none;
-            border-radius: 5px;
-            cursor: pointer;
-            font-size: 16px;
-        }
-        button:hover {
-            background-color: #0056b3;
-        }
-        button:disabled {
-            background-color: #6c757d;
-            cursor: not-allowed;
-        }
-        .sources {
-            font-size: 12px;
-            color: #666;
-            margin-top: 5px;
-        }
-        .loading {
-            text-align: center;
-            color: #666;
-            font-style: italic;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>🗑️ NEA Waste Management RAG System</h1>
-        
-        <div id="status" class="status not-ready">
-            Checking system status...
-        </div>
-        
-        <div class="chat-container" id="chat-container">
-            <div class="message bot-message">
-                Hello! I'm your NEA Waste Management assistant. Ask me anything about recycling, waste statistics, or waste management in Singapore.
-            </div>
-        </div>
-        
-        <div class="input-container">
-            <input type="text" id="question-input" placeholder="Ask a question about waste management..." disabled>
-            <button id="ask-button" disabled>Ask</button>
-        </div>
-    </div>
-
-    <script>
-        let chatHistory = [];
-        
-        // Check system status
-        async function checkStatus() {
-            try {
-                const response = await fetch('/api/status');
-                const data = await response.json();
-                
-                const statusDiv = document.getElementById('status');
-                const input = document.getElementById('question-input');
-                const button = document.getElementById('ask-button');
-                
-                if (data.status === 'ready') {
-                    statusDiv.className = 'status ready';
-                    statusDiv.textContent = '✅ System ready - Ask your questions!';
-                    input.disabled = false;
-                    button.disabled = false;
-                } else {
-                    statusDiv.className = 'status not-ready';
-                    statusDiv.textContent = '❌ System not ready - Check Ollama installation';
-                    input.disabled = true;
-                    button.disabled = true;
-                }
-            } catch (error) {
-                console.error('Error checking status:', error);
-            }
-        }
-        
-        // Add message to chat
-        function addMessage(content, isUser = false, sources = []) {
-            const chatContainer = document.getElementById('chat-container');
-            const messageDiv = document.createElement('div');
-            messageDiv.className = `message ${isUser ? 'user-message' : 'bot-message'}`;
-            
-            let html = content;
-            if (sources && sources.length > 0) {
-                html += '<div class="sources">Sources: ' + sources.join(', ') + '</div>';
-            }
-            
-            messageDiv.innerHTML = html;
-            chatContainer.appendChild(messageDiv);
-            chatContainer.scrollTop = chatContainer.scrollHeight;
-        }
-        
-        // Ask question
-        async function askQuestion() {
-            const input = document.getElementById('question-input');
-            const button = document.getElementById('ask-button');
-            const question = input.value.trim();
-            
-            if (!question) return;
-            
-            // Disable input during processing
-            input.disabled = true;
-            button.disabled = true;
-            
-            // Add user message
-            addMessage(question, true);
-            input.value = '';
-            
-            // Add loading message
-            const loadingDiv = document.createElement('div');
-            loadingDiv.className = 'message bot-message loading';
-            loadingDiv.textContent = 'Thinking...';
-            document.getElementById('chat-container').appendChild(loadingDiv);
-            
-            try {
-                const response = await fetch('/api/ask', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        question: question,
-                        chat_history: chatHistory
-                    })
-                });
-                
-                const data = await response.json();
-                
-                // Remove loading message
-                loadingDiv.remove();
-                
-                if (data.error) {
-                    addMessage('Sorry, I encountered an error: ' + data.error);
-                } else {
-                    addMessage(data.answer, false, data.sources);
-                    chatHistory.push([question, data.answer]);
-                }
-            } catch (error) {
-                loadingDiv.remove();
-                addMessage('Sorry, I encountered an error: ' + error.message);
-            }
-            
-            // Re-enable input
-            input.disabled = false;
-            button.disabled = false;
-            input.focus();
-        }
-        
-        // Event listeners
-        document.getElementById('ask-button').addEventListener('click', askQuestion);
-        document.getElementById('question-input').addEventListener('keypress', function(e) {
-            if (e.key === 'Enter') {
-                askQuestion();
-            }
-        });
-        
-        // Initial status check
-        checkStatus();
-        
-        // Check status every 30 seconds
-        setInterval(checkStatus, 30000);
-    </script>
-</body>
-</html>'''
-    
-    with open(templates_dir / 'index.html', 'w', encoding='utf-8') as f:
-        f.write(html_template)
-
 def main():
     """Main function"""
     print("🌐 Starting NEA RAG System Web Interface...")
     
-    # Create templates
-    create_templates()
-    
-    # Initialize RAG system
-    print("📚 Initializing RAG system...")
-    if not initialize_rag_system():
-        print("❌ Failed to initialize RAG system")
-        print("Please ensure:")
-        print("1. Ollama is installed and running")
-        print("2. Llama3 model is pulled: ollama pull llama3")
-        print("3. All dependencies are installed: pip install -r requirements.txt")
-        return
+    # Initialize RAG system in the background so the UI and /api/status
+    # respond while embeddings and the vector store load
+    print("📚 Initializing RAG system in the background...")
+    threading.Thread(target=initialize_in_background, daemon=True).start()
+    threading.Thread(target=poll_ollama, daemon=True).start()
     
-    print("✅ RAG system initialized successfully")
     print("🌐 Starting web server...")
     print("📱 Open your browser to: http://localhost:5000")
     
-    # Start Flask app
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Serve with waitress when available; the dev server's reloader would
+    # re-import the RAG stack on every file change
+    if serve is not None:
+        serve(app, host='0.0.0.0', port=5000, threads=SERVER_THREADS)
+    else:
+        app.run(debug=False, threaded=True, host='0.0.0.0', port=5000)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file